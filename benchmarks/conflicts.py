@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+"""Benchmark of the conflict rates of the storages written by concurrent
+pushes. Runs N threads, each appending M records to the same persistent
+object in its own connection and transaction, and reports the number of
+ConflictErrors raised on commit. Run it from the buildout with:
+
+    bin/zopepy benchmarks/conflicts.py [N] [M]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import transaction
+from persistent import Persistent
+from persistent.list import PersistentList
+from senaite.referral.idempotency import ProcessedKeys
+from senaite.referral.notifications import NotificationLog
+from ZODB import DB
+from ZODB.FileStorage import FileStorage
+from ZODB.POSException import ConflictError
+
+# Max number of times a transaction is retried after a conflict
+MAX_RETRIES = 10
+
+
+class LegacyNotificationLog(Persistent):
+    """Notification log with the history stored in a PersistentList and
+    without conflict resolution, as it was before
+    """
+
+    def __init__(self, size=50):
+        self.size = size
+        self.last = None
+        self.count = 0
+        self.history = PersistentList()
+
+    def append(self, post):
+        self.last = dict(post)
+        self.count += 1
+        self.history.append(repr(post))
+        overflow = len(self.history) - self.size
+        if overflow > 0:
+            del self.history[:overflow]
+
+
+def append_post(storage, thread_num, num):
+    storage.append({
+        "url": "http://example.com/push",
+        "status": 200,
+        "datetime": datetime.now().isoformat(),
+        "payload": {"thread": thread_num, "num": num},
+    })
+
+
+def add_key(storage, thread_num, num):
+    key = "LAB:{}-{}".format(thread_num, num)
+    storage.add(key, {"success": True})
+
+
+def run(db, name, factory, func, threads, pushes):
+    """Runs the benchmark for the storage created by the factory and returns
+    a tuple (commits, conflicts, seconds)
+    """
+    conn = db.open()
+    conn.root()[name] = factory()
+    transaction.commit()
+    conn.close()
+
+    stats = {"commits": 0, "conflicts": 0}
+    lock = threading.Lock()
+    barrier = threading.Event()
+
+    def worker(thread_num):
+        tm = transaction.TransactionManager()
+        conn = db.open(transaction_manager=tm)
+        barrier.wait()
+        for num in range(pushes):
+            for retry in range(MAX_RETRIES):
+                tm.begin()
+                func(conn.root()[name], thread_num, num)
+                try:
+                    tm.commit()
+                except ConflictError:
+                    tm.abort()
+                    with lock:
+                        stats["conflicts"] += 1
+                    continue
+                with lock:
+                    stats["commits"] += 1
+                break
+        conn.close()
+
+    workers = [threading.Thread(target=worker, args=(num,))
+               for num in range(threads)]
+    for thread in workers:
+        thread.start()
+    start = time.time()
+    barrier.set()
+    for thread in workers:
+        thread.join()
+    return stats["commits"], stats["conflicts"], time.time() - start
+
+
+def main(threads=8, pushes=50):
+    path = tempfile.mkdtemp()
+    db = DB(FileStorage(os.path.join(path, "Data.fs")))
+    benchmarks = [
+        ("http_posts (legacy)", LegacyNotificationLog, append_post),
+        ("http_posts", NotificationLog, append_post),
+        ("idempotency keys", ProcessedKeys, add_key),
+    ]
+    try:
+        print("{} threads x {} pushes".format(threads, pushes))
+        for name, factory, func in benchmarks:
+            commits, conflicts, seconds = run(
+                db, name, factory, func, threads, pushes)
+            rate = float(conflicts) / (commits + conflicts) * 100
+            print("{:<20} commits: {:>5} conflicts: {:>5} ({:5.1f}%) "
+                  "{:6.2f}s".format(name, commits, conflicts, rate, seconds))
+    finally:
+        db.close()
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -39,14 +39,14 @@ class RecoverFromShipmentAdapter(RequestContextAware):
         """
 
         # Remove samples from current context (OutboundShipment)
-        shipped_samples = self.context.getRawSamples()
+        shipped_samples = set(self.context.getRawSamples())
 
         # Bail out those uids that are not present in the OutboundShipment
         uids = filter(lambda uid: uid in shipped_samples, uids)
 
         # Remove the samples from the outbound shipment
-        shipped_samples = filter(lambda uid: uid not in uids, shipped_samples)
-        self.context.setSamples(shipped_samples)
+        self.context.removeSamples(uids)
+        self.context.reindexObject(idxs=["num_samples"])
 
         sample_ids = []
         for uid in uids:
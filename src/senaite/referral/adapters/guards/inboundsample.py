@@ -19,6 +19,7 @@
 # Some rights reserved, see README and LICENSE.
 
 from senaite.referral.adapters.guards import BaseGuardAdapter
+from senaite.referral.transfer import is_transfer_in_progress
 from zope.interface import implementer
 
 from bika.lims.interfaces import IGuardAdapter
@@ -34,4 +35,10 @@ class InboundSampleGuardAdapter(BaseGuardAdapter):
         """
         if self.context.getRawSample():
             return False
+
+        # Not all inbound samples from the shipment have been transferred yet
+        shipment = self.context.getInboundShipment()
+        if is_transfer_in_progress(shipment):
+            return False
+
         return True
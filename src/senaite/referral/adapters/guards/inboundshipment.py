@@ -19,10 +19,14 @@
 # Some rights reserved, see README and LICENSE.
 
 from senaite.referral.adapters.guards import BaseGuardAdapter
+from senaite.referral.reception import COUNTERPART
+from senaite.referral.reception import get_reception_count
+from senaite.referral.reception import PENDING
+from senaite.referral.reception import TOTAL
+from senaite.referral.transfer import is_transfer_in_progress
 from zope.interface import implementer
 
 from bika.lims.interfaces import IGuardAdapter
-from bika.lims.workflow import isTransitionAllowed as is_transition_allowed
 
 
 @implementer(IGuardAdapter)
@@ -32,35 +36,27 @@ class InboundShipmentGuardAdapter(BaseGuardAdapter):
         """Returns true if the inbound shipment contains at least one sample
         that has not been received yet, although it can
         """
-        action_id = "receive_inbound_sample"
-        for inbound_sample in self.context.getInboundSamples():
-            if inbound_sample.getRawSample():
-                continue
-            if is_transition_allowed(inbound_sample, action_id):
-                return True
-        return False
+        if is_transfer_in_progress(self.context):
+            # Not all inbound samples have been transferred yet
+            return False
+
+        return get_reception_count(self.context, PENDING) > 0
 
     def guard_receive_inbound_shipment(self):
         """Returns true if the inbound shipment contains inbound samples and
         none of them are reception due
         """
-        samples = self.context.getInboundSamples()
-        if not samples:
+        if is_transfer_in_progress(self.context):
+            # Not all inbound samples have been transferred yet
+            return False
+
+        if not get_reception_count(self.context, TOTAL):
             return False
 
-        action_id = "receive_inbound_sample"
-        for inbound_sample in samples:
-            if inbound_sample.getRawSample():
-                continue
-            if is_transition_allowed(inbound_sample, action_id):
-                return False
-        return True
+        return get_reception_count(self.context, PENDING) == 0
 
     def guard_reject_inbound_shipment(self):
         """Returns true if the inbound shipment does not have any sample or
         none of them were received
         """
-        for inbound_sample in self.context.getInboundSamples():
-            if inbound_sample.getRawSample():
-                return False
-        return True
+        return get_reception_count(self.context, COUNTERPART) == 0
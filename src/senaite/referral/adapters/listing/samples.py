@@ -29,13 +29,19 @@ from zope.component import adapter
 from zope.interface import implementer
 
 from bika.lims import api
-from bika.lims.utils import get_link_for
+from bika.lims.utils import get_link
 
 
 @adapter(IListingView)
 @implementer(IListingViewAdapter)
 class SamplesListingViewAdapter(object):
 
+    # Icons for the shipments, by direction
+    icons = {
+        "outbound": "export",
+        "inbound": "import",
+    }
+
     def __init__(self, listing, context):
         self.listing = listing
         self.context = context
@@ -48,29 +54,21 @@ class SamplesListingViewAdapter(object):
 
     @check_installed(None)
     def folder_item(self, obj, item, index):
-        obj = api.get_object(obj)
-
-        # Outbound shipment
-        outbound = obj.getOutboundShipment()
-        if outbound:
-            link = get_link_for(outbound)
-            ico = self.get_glyphicon("export")
-            item["replace"]["Shipment"] = "{}{}".format(ico, link)
-            outbound = api.get_title(outbound)
-
-        # Inbound shipment
-        inbound = obj.getInboundShipment()
-        if inbound:
-            link = get_link_for(inbound)
-            ico = self.get_glyphicon("import")
-            val = "{}{}".format(ico, link)
-            if outbound:
-                val = "&nbsp;|&nbsp;".join([val, item["replace"]["Shipment"]])
-            item["replace"]["Shipment"] = val
-            inbound = api.get_title(inbound)
-
-        shipment = filter(None, [outbound, inbound])
-        item["Shipment"] = " ".join(shipment)
+        # Shipments the sample is assigned to, from catalog metadata
+        shipments = getattr(obj, "referral_shipments", None) or []
+        links = []
+        titles = []
+        for shipment in shipments:
+            direction = shipment.get("direction")
+            ico = self.get_glyphicon(self.icons.get(direction))
+            link = get_link(shipment.get("url"), value=shipment.get("title"))
+            links.append("{}{}".format(ico, link))
+            titles.append(shipment.get("title"))
+
+        if links:
+            # Inbound shipment first
+            item["replace"]["Shipment"] = "&nbsp;|&nbsp;".join(links[::-1])
+        item["Shipment"] = " ".join(titles)
 
         # Show an alert if the sample has been rejected at reference lab
         if api.get_review_status(obj) == "rejected_at_reference":
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.referral.interfaces import IReferralObjectInfo
+from zope.interface import implementer
+
+from bika.lims import api
+
+
+@implementer(IReferralObjectInfo)
+class ObjectInfo(object):
+    """Returns the basic information of an object, the one the remote
+    laboratory relies on to resolve the counterpart object
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def to_dict(self):
+        return {
+            "id": api.get_id(self.context),
+            "uid": api.get_uid(self.context),
+            "portal_type": api.get_portal_type(self.context),
+        }
+
+
+class SampleObjectInfo(ObjectInfo):
+    """Information of a Sample. The referring laboratory resolves the
+    counterpart by the Client Sample ID
+    """
+
+    def to_dict(self):
+        info = super(SampleObjectInfo, self).to_dict()
+        info.update({
+            "ClientSampleID": self.context.getClientSampleID(),
+        })
+        return info
+
+
+class SampleRejectObjectInfo(SampleObjectInfo):
+    """Information of a Sample for the "reject" action. The referring
+    laboratory needs the rejection reasons
+    """
+
+    def to_dict(self):
+        info = super(SampleRejectObjectInfo, self).to_dict()
+        info.update({
+            "RejectionReasons": self.context.getRejectionReasons(),
+        })
+        return info
+
+
+class InboundSampleObjectInfo(ObjectInfo):
+    """Information of an Inbound Sample. The referring laboratory resolves
+    the counterpart by the sample id of origin
+    """
+
+    def to_dict(self):
+        info = super(InboundSampleObjectInfo, self).to_dict()
+        info.update({
+            "referring_id": self.context.getReferringID(),
+        })
+        return info
+
+
+class ShipmentObjectInfo(ObjectInfo):
+    """Information of an Inbound or Outbound Shipment. The remote laboratory
+    resolves the counterpart by the shipment id
+    """
+
+    def to_dict(self):
+        info = super(ShipmentObjectInfo, self).to_dict()
+        info.update({
+            "shipment_id": self.context.getShipmentID(),
+        })
+        return info
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import math
+from collections import OrderedDict
+
+import transaction
+from senaite.referral.outbox import add_intent
+from senaite.referral.outbox import is_combinable
+
+from bika.lims import api
+
+# Attribute of the transaction where the notifications pending to be sent are
+# collected until the transaction is committed
+TXN_NOTIFICATIONS_KEY = "_senaite_referral_notifications"
+
+# Consumer that processes multiple items at once in the remote laboratory
+REFERRAL_CONSUMER = "senaite.referral.consumer"
+
+# Consumer that updates the analyses of a single sample
+OUTBOUND_SAMPLE_CONSUMER = "senaite.referral.outbound_sample"
+
+
+def add_notification(obj, laboratory, payload, timeout=5):
+    """Collects the notification (POST request) about the object passed-in
+    for the remote laboratory. Notifications collected while the current
+    request transaction is in progress are flushed to the outbox right before
+    the commit, combined into a single payload per laboratory when possible
+    """
+    txn = transaction.get()
+    notifications = getattr(txn, TXN_NOTIFICATIONS_KEY, None)
+    if notifications is None:
+        notifications = OrderedDict()
+        setattr(txn, TXN_NOTIFICATIONS_KEY, notifications)
+        portal = api.get_portal()
+        txn.addBeforeCommitHook(flush, args=(portal, notifications))
+
+    lab_uid = api.get_uid(laboratory)
+    lab_notifications = notifications.setdefault(lab_uid, [])
+    lab_notifications.append((obj, laboratory, payload, timeout))
+
+
+def flush(portal, notifications):
+    """Stores the notifications passed-in to the outbox, with a single payload
+    per laboratory for those that can be combined
+    """
+    for lab_uid, lab_notifications in notifications.items():
+        combinable = is_combinable(lab_uid, portal=portal)
+        batch = []
+        for notification in lab_notifications:
+            obj, laboratory, payload, timeout = notification
+            if not combinable or get_items(payload) is None:
+                # Cannot be combined, send on its own
+                add_intent(obj, laboratory, payload, timeout=timeout,
+                           portal=portal)
+                continue
+            batch.append(notification)
+
+        if len(batch) == 1:
+            obj, laboratory, payload, timeout = batch[0]
+            add_intent(obj, laboratory, payload, timeout=timeout,
+                       portal=portal)
+
+        elif batch:
+            add_batch_intent(batch, portal)
+
+    notifications.clear()
+
+
+def add_batch_intent(notifications, portal):
+    """Stores a single intent to the outbox that combines the notifications
+    passed-in, all for same laboratory
+    """
+    items = []
+    timeouts = []
+    parts = []
+    for obj, laboratory, payload, timeout in notifications:
+        items.extend(get_items(payload))
+        timeouts.append(timeout)
+        parts.append((obj, payload))
+
+    # infer the timeout based on the number of items
+    timeout = math.ceil((math.log(len(items))+1)*5)
+    timeout = max(timeouts + [timeout])
+
+    # Build the payload with the reserved parameters from the first one
+    obj, laboratory, payload = notifications[0][:3]
+    data = dict(payload)
+    data.update({
+        "consumer": REFERRAL_CONSUMER,
+        "items": items,
+    })
+    data.pop("sample", None)
+    add_intent(obj, laboratory, data, timeout=timeout, parts=parts,
+               portal=portal)
+
+
+def get_items(payload):
+    """Returns the list of items the payload passed-in translates to when
+    combined with other payloads into a single payload for the referral
+    consumer. Returns None if the payload cannot be combined
+    """
+    consumer = payload.get("consumer")
+    if consumer == REFERRAL_CONSUMER:
+        return payload.get("items")
+
+    elif consumer == OUTBOUND_SAMPLE_CONSUMER:
+        return [{
+            "portal_type": "AnalysisRequest",
+            "action": "update_analyses",
+            "sample": payload.get("sample"),
+        }]
+
+    return None
@@ -81,6 +81,23 @@ class IReferralControlPanel(Interface):
         required=0,
     )
 
+    chunk_size_ship = schema.Int(
+        title=_(
+            u"label_chunk_size_ship",
+            u"Maximum number of samples to ship in a single task"
+        ),
+        description=_(
+            u"description_chunk_size_ship",
+            u"If the number of samples to add to a shipment is above this "
+            u"value, the queue will split the job in as many tasks as "
+            u"required. If the value is 0 or senaite queue is not installed, "
+            u"the system won't ship the samples asynchronously and all them "
+            u"will be held in a single request"
+        ),
+        default=50,
+        required=0,
+    )
+
 
 class ReferralControlPanelForm(RegistryEditForm):
     schema = IReferralControlPanel
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from plone.memoize import view
+from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
+from senaite.referral import messageFactory as _
+from senaite.referral.browser.retry_notification import RetryNotificationView
+from senaite.referral.notifications import get_failed_notifications
+
+from bika.lims import api
+
+
+class FailedNotificationsView(RetryNotificationView):
+    """Lists the objects for which the last notification to a remote
+    laboratory failed and allows to retry them
+    """
+    template = ViewPageTemplateFile("templates/failed_notifications.pt")
+
+    # Max number of failed notifications to display
+    limit = 100
+
+    def __init__(self, context, request):
+        super(FailedNotificationsView, self).__init__(context, request)
+        self.back_url = self.current_url
+
+    def __call__(self):
+        form = self.request.form
+
+        # Form submit toggle
+        form_submitted = form.get("submitted", False)
+        form_retry = form.get("retry", False)
+
+        if form_submitted and form_retry:
+            posts = self.get_posts()
+            if not posts:
+                message = _("No POST notification in history")
+                return self.redirect(message=message, level="error")
+
+            # Retry, but do not stop on errors
+            errors = filter(None, [self.repost(post) for post in posts])
+            for error in errors:
+                self.add_status_message(error, level="error")
+
+            if not errors:
+                message = _("Notifications scheduled for retry: {}".format(
+                    len(posts)))
+                self.add_status_message(message)
+            return self.redirect()
+
+        return self.template()
+
+    def get_objects(self):
+        """Returns the objects from the "uids" request parameter. Returns an
+        empty list if no uids are set
+        """
+        if not self.get_uids_from_request():
+            return []
+        return super(FailedNotificationsView, self).get_objects()
+
+    @view.memoize
+    def get_laboratory(self):
+        """Returns the laboratory to filter the notifications by, if any
+        """
+        uid = self.request.form.get("laboratory")
+        return api.get_object_by_uid(uid, default=None)
+
+    @view.memoize
+    def get_records(self):
+        """Returns the status records of the failed notifications, sorted from
+        newest to oldest
+        """
+        laboratory = self.get_laboratory()
+        records = get_failed_notifications(laboratory=laboratory)
+        return sorted(records, key=lambda rec: rec.get("datetime"),
+                      reverse=True)
+
+    def get_total(self):
+        return len(self.get_records())
+
+    @view.memoize
+    def get_failed_data(self):
+        """Returns a list of dicts with the information of the failed
+        notifications to display
+        """
+        data = []
+        laboratories = {}
+        for record in self.get_records()[:self.limit]:
+            obj = api.get_object_by_uid(record["uid"], default=None)
+            if not obj:
+                continue
+
+            lab_uid = record.get("laboratory")
+            if lab_uid not in laboratories:
+                lab = api.get_object_by_uid(lab_uid, default=None)
+                laboratories[lab_uid] = lab and api.get_title(lab) or ""
+
+            record.update({
+                "id": api.get_id(obj),
+                "url": api.get_url(obj),
+                "portal_type": api.get_portal_type(obj),
+                "laboratory_title": laboratories[lab_uid],
+            })
+            data.append(record)
+        return data
+
+    def get_failed_uids(self):
+        """Returns the uids of the displayed objects for which the
+        notification failed
+        """
+        return [record["uid"] for record in self.get_failed_data()]
@@ -48,11 +48,10 @@ class RetryNotificationView(BaseView):
                 message = _("No POST notification in history")
                 return self.redirect(message=message, level="error")
 
-            # Retry
-            for post in posts:
-                err_msg = self.repost(post)
-                if err_msg:
-                    return self.redirect(message=err_msg, level="error")
+            # Retry, but do not stop on errors
+            errors = filter(None, [self.repost(post) for post in posts])
+            for error in errors:
+                self.add_status_message(error, level="error")
 
         return self.redirect()
 
@@ -81,7 +80,7 @@ class RetryNotificationView(BaseView):
         """Returns a dict with the information about the POST notification
         for the given object
         """
-        post = get_last_post(obj)
+        post = get_last_post(obj, full=True)
         if not post:
             return None
 
@@ -23,7 +23,7 @@ from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from senaite.referral import messageFactory as _
 from senaite.referral.browser import BaseView
 from senaite.referral.interfaces import IOutboundSampleShipment
-from senaite.referral.workflow import ship_sample
+from senaite.referral.workflow import do_queue_or_ship_samples
 
 from bika.lims import api
 from bika.lims.catalog import CATALOG_ANALYSIS_REQUEST_LISTING
@@ -59,9 +59,23 @@ class ShipSamplesView(BaseView):
 
         if shipment:
             # Ship the samples
-            for sample in samples:
-                sample_obj = sample["obj"]
-                ship_sample(sample_obj, shipment)
+            objects = map(lambda samp: samp["obj"], samples)
+            shipped = do_queue_or_ship_samples(objects, shipment)
+            if not isinstance(shipped, list):
+                task_uid = shipped.task_short_uid
+                message = _("A task for the shipment of {} samples has been "
+                            "added to the queue: {}".format(len(samples),
+                                                            task_uid))
+                return self.redirect(message=message)
+
+            # Report the samples that could not be shipped, if any
+            shipped = map(api.get_uid, shipped)
+            skipped = filter(lambda samp: samp["uid"] not in shipped, samples)
+            if skipped:
+                titles = ", ".join(map(lambda samp: samp["title"], skipped))
+                message = _("Shipped {} samples. Cannot ship {} samples: {}"
+                            .format(len(shipped), len(skipped), titles))
+                return self.redirect(message=message, level="warning")
 
             titles = ", ".join(map(lambda samp: samp["title"], samples))
             message = _("Shipped {} samples: {}".format(len(samples), titles))
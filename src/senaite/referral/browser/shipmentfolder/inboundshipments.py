@@ -19,7 +19,6 @@
 # Some rights reserved, see README and LICENSE.
 
 import collections
-from plone.memoize import view
 from senaite.core.listing import ListingView
 from senaite.referral import messageFactory as _
 from senaite.referral.catalog import SHIPMENT_CATALOG
@@ -28,7 +27,6 @@ from senaite.referral.utils import get_image_url
 from bika.lims import api
 from bika.lims.browser import ulocalized_time
 from bika.lims.utils import get_link
-from bika.lims.utils import get_link_for
 
 
 class InboundSampleShipmentFolderView(ListingView):
@@ -67,6 +65,8 @@ class InboundSampleShipmentFolderView(ListingView):
             }),
             ("num_samples", {
                 "title": _("#Samples"),
+                "sortable": True,
+                "index": "num_samples",
             }),
             ("created_by", {
                 "title": _("Created by"),
@@ -78,15 +78,23 @@ class InboundSampleShipmentFolderView(ListingView):
             }),
             ("dispatched", {
                 "title": _("Dispatched"),
+                "sortable": True,
+                "index": "dispatched_date",
             }),
             ("received", {
                 "title": _("Received"),
+                "sortable": True,
+                "index": "received_date",
             }),
             ("rejected", {
                 "title": _("Rejected"),
+                "sortable": True,
+                "index": "rejected_date",
             }),
             ("cancelled", {
                 "title": _("Cancelled"),
+                "sortable": True,
+                "index": "cancelled_date",
             }),
             ("state_title", {
                 "title": _("State"),
@@ -126,33 +134,27 @@ class InboundSampleShipmentFolderView(ListingView):
             the template
         :index: current index of the item
         """
-        obj = api.get_object(obj)
         href = api.get_url(obj)
-        shipment_id = obj.getShipmentID()
+        shipment_id = obj.shipment_id
         item["shipment_id"] = shipment_id
         item["replace"]["shipment_id"] = get_link(href, shipment_id)
-        item["num_samples"] = len(obj.getInboundSamples())
-        item["created_by"] = self.get_creator_fullname(obj)
-
-        referring = obj.getReferringLaboratory()
-        item["referring_laboratory"] = api.get_title(referring)
-        item["replace"]["referring_laboratory"] = get_link_for(referring)
-
-        lab_code = referring.getCode()
-        lab_url = api.get_url(referring)
+        item["num_samples"] = obj.num_samples or 0
+        item["created_by"] = obj.creator_fullname or obj.Creator
+
+        lab_title = obj.laboratory_title
+        lab_code = obj.laboratory_code
+        lab_url = obj.laboratory_url
+        item["referring_laboratory"] = lab_title
+        item["replace"]["referring_laboratory"] = get_link(lab_url, lab_title)
         item["lab_code"] = lab_code
         item["replace"]["lab_code"] = get_link(lab_url, value=lab_code)
 
         # dispatched, received, rejected, cancelled
-        dispatched = obj.getDispatchedDateTime()
-        received = obj.getReceivedDateTime()
-        rejected = obj.getRejectedDateTime()
-        cancelled = obj.getCancelledDateTime()
         item.update({
-            "dispatched": self.get_localized_date(dispatched, show_time=True),
-            "received": self.get_localized_date(received, show_time=True),
-            "rejected": self.get_localized_date(rejected, show_time=True),
-            "cancelled": self.get_localized_date(cancelled, show_time=True),
+            "dispatched": self.get_localized_date(obj.dispatched_date),
+            "received": self.get_localized_date(obj.received_date),
+            "rejected": self.get_localized_date(obj.rejected_date),
+            "cancelled": self.get_localized_date(obj.cancelled_date),
         })
         return item
 
@@ -160,14 +162,3 @@ class InboundSampleShipmentFolderView(ListingView):
         if not date_value:
             return default
         return ulocalized_time(date_value, long_format=show_time)
-
-    @view.memoize
-    def get_object(self, uid):
-        return api.get_object_by_uid(uid)
-
-    def get_creator_fullname(self, shipment):
-        """Returns the fullname of the user who created the shipment
-        """
-        creator = shipment.Creator()
-        properties = api.get_user_properties(creator)
-        return properties.get("fullname", creator)
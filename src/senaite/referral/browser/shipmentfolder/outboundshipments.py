@@ -23,7 +23,7 @@ from senaite.core.listing import ListingView
 from senaite.referral import messageFactory as _
 from senaite.referral.catalog import SHIPMENT_CATALOG
 from senaite.referral.notifications import get_last_post
-from senaite.referral.notifications import is_error
+from senaite.referral.notifications import get_notifications_index
 from senaite.referral.utils import get_image_url
 from senaite.referral.utils import translate as t
 
@@ -31,7 +31,6 @@ from bika.lims import api
 from bika.lims.browser import ulocalized_time
 from bika.lims.utils import get_image
 from bika.lims.utils import get_link
-from bika.lims.utils import get_link_for
 
 
 class OutboundSampleShipmentFolderView(ListingView):
@@ -68,6 +67,8 @@ class OutboundSampleShipmentFolderView(ListingView):
             }),
             ("num_samples", {
                 "title": _("#Samples"),
+                "sortable": True,
+                "index": "num_samples",
             }),
             ("created_by", {
                 "title": _("Created by"),
@@ -79,18 +80,28 @@ class OutboundSampleShipmentFolderView(ListingView):
             }),
             ("dispatched", {
                 "title": _("Dispatched"),
+                "sortable": True,
+                "index": "dispatched_date",
             }),
             ("delivered", {
                 "title": _("Delivered"),
+                "sortable": True,
+                "index": "delivered_date",
             }),
             ("lost", {
                 "title": _("Lost"),
+                "sortable": True,
+                "index": "lost_date",
             }),
             ("rejected", {
                 "title": _("Rejected"),
+                "sortable": True,
+                "index": "rejected_date",
             }),
             ("cancelled", {
                 "title": _("Cancelled"),
+                "sortable": True,
+                "index": "cancelled_date",
             }),
             ("state_title", {
                 "title": _("State"),
@@ -158,48 +169,43 @@ class OutboundSampleShipmentFolderView(ListingView):
             the template
         :index: current index of the item
         """
-        obj = api.get_object(obj)
         href = api.get_url(obj)
-        shipment_id = obj.getShipmentID()
+        shipment_id = obj.shipment_id
         item["shipment_id"] = shipment_id
         item["replace"]["shipment_id"] = get_link(href, shipment_id)
 
-        reference = obj.getReferenceLaboratory()
-        item["reference_laboratory"] = api.get_title(reference)
-        item["replace"]["reference_laboratory"] = get_link_for(reference)
-
-        lab_code = reference.getCode()
-        lab_url = api.get_url(reference)
+        lab_title = obj.laboratory_title
+        lab_code = obj.laboratory_code
+        lab_url = obj.laboratory_url
+        item["reference_laboratory"] = lab_title
+        item["replace"]["reference_laboratory"] = get_link(lab_url, lab_title)
         item["lab_code"] = lab_code
         item["replace"]["lab_code"] = get_link(lab_url, value=lab_code)
 
-        item["num_samples"] = len(obj.getRawSamples())
-        item["created_by"] = self.get_creator_fullname(obj)
+        item["num_samples"] = obj.num_samples or 0
+        item["created_by"] = obj.creator_fullname or obj.Creator
 
-        # dispatched, received, rejected, cancelled
-        dispatched = obj.getDispatchedDateTime()
-        delivered = obj.getDeliveredDateTime()
-        rejected = obj.getRejectedDateTime()
-        lost = obj.getLostDateTime()
-        cancelled = obj.getCancelledDateTime()
+        # dispatched, delivered, lost, rejected, cancelled
         item.update({
-            "dispatched": self.get_localized_date(dispatched, show_time=True),
-            "delivered": self.get_localized_date(delivered, show_time=True),
-            "rejected": self.get_localized_date(rejected, show_time=True),
-            "lost": self.get_localized_date(lost, show_time=True),
-            "cancelled": self.get_localized_date(cancelled, show_time=True),
+            "dispatched": self.get_localized_date(obj.dispatched_date),
+            "delivered": self.get_localized_date(obj.delivered_date),
+            "rejected": self.get_localized_date(obj.rejected_date),
+            "lost": self.get_localized_date(obj.lost_date),
+            "cancelled": self.get_localized_date(obj.cancelled_date),
         })
 
         # If the notification errored, then add an icon
-        post = get_last_post(obj)
-        if not post:
+        record = get_notifications_index().get_record(api.get_uid(obj))
+        if not record:
             # Not notified to the reference lab
             msg = t(_("Reference lab not notified"))
             icon = get_image("warning.png", title=msg)
             self._append_html_element(item, "shipment_id", icon)
 
-        elif is_error(post):
-            # Notification to the reference lab errored
+        elif not record.get("success"):
+            # Notification to the reference lab errored. The message is only
+            # kept in the shipment, so wake it up
+            post = get_last_post(api.get_object(obj)) or record
             msg = t(_("The notification to reference lab errored: {}"))
             message = "[{}] {}".format(post.get("status"), post.get("message"))
             msg = msg.format(message)
@@ -230,10 +236,3 @@ class OutboundSampleShipmentFolderView(ListingView):
         if not date_value:
             return default
         return ulocalized_time(date_value, long_format=show_time)
-
-    def get_creator_fullname(self, shipment):
-        """Returns the fullname of the user who created the shipment
-        """
-        creator = shipment.Creator()
-        properties = api.get_user_properties(creator)
-        return properties.get("fullname", creator)
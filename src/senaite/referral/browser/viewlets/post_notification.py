@@ -24,6 +24,7 @@ from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from senaite.referral import check_installed
 from senaite.referral.interfaces import IInboundSampleShipment
 from senaite.referral.notifications import get_last_post
+from senaite.referral.notifications import get_notification_records
 
 from bika.lims import api
 
@@ -47,8 +48,8 @@ class PostNotificationViewlet(ViewletBase):
             if self.is_error():
                 return True
 
-            samples = self.context.getSamples()
-            posts = filter(None, [get_last_post(sample) for sample in samples])
+            uids = self.context.getRawSamples()
+            posts = get_notification_records(uids)
             if not posts and self.get_notification():
                 return True
 
@@ -22,6 +22,7 @@ from plone.app.layout.viewlets import ViewletBase
 from plone.memoize import view
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from senaite.referral.notifications import get_last_post
+from senaite.referral.notifications import get_notification_records
 
 from bika.lims import api
 
@@ -63,8 +64,8 @@ class ShipmentNotificationViewlet(ViewletBase):
         """Returns a list of dicts with information about the POST notifications
         for all samples from this current shipment
         """
-        samples = self.context.getSamples()
-        return filter(None, [self.get_post_info(sample) for sample in samples])
+        uids = self.context.getRawSamples()
+        return get_notification_records(uids)
 
     def get_failed_samples_posts(self):
         """Return a list of dicts with information about the POST notifications
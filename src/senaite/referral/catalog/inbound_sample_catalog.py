@@ -43,11 +43,22 @@ INDEXES = BASE_INDEXES + [
 
 COLUMNS = BASE_COLUMNS + [
     # attribute name
+    "analyses",
+    "client_title",
+    "client_url",
     "date_sampled",
     "laboratory_code",
     "laboratory_title",
+    "priority",
     "referring_id",
+    "sample_date_sampled",
     "sample_id",
+    "sample_review_state",
+    "sample_type",
+    "sample_type_id",
+    "sample_type_url",
+    "sample_uid",
+    "sample_url",
     "shipment_id",
 ]
 
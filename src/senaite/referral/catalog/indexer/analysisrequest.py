@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from plone.indexer import indexer
+
+from bika.lims import api
+from bika.lims.interfaces import IAnalysisRequest
+from bika.lims.interfaces import IBikaCatalogAnalysisRequestListing
+
+
+@indexer(IAnalysisRequest, IBikaCatalogAnalysisRequestListing)
+def referral_shipments(instance):
+    """Returns a list of dicts with the uid, title, direction and url of the
+    shipments the sample is assigned to, outbound shipment first
+    """
+    shipments = [
+        ("outbound", instance.getOutboundShipment()),
+        ("inbound", instance.getInboundShipment()),
+    ]
+    values = []
+    for direction, shipment in shipments:
+        if not shipment:
+            continue
+        values.append({
+            "uid": api.get_uid(shipment),
+            "title": api.get_title(shipment),
+            "direction": direction,
+            "url": api.get_url(shipment),
+        })
+    return values
@@ -18,13 +18,43 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+import collections
+
 from plone.indexer import indexer
+from senaite.referral.catalog.indexing import get_shared_index_values
 from senaite.referral.interfaces import IInboundSample
 from senaite.referral.interfaces import IInboundSampleCatalog
 
 from bika.lims import api
 
 
+def get_shipment_values(shipment):
+    """Returns the index values the inbound samples from the shipment
+    passed-in have in common
+    """
+    laboratory = shipment.getReferringLaboratory()
+    return {
+        "laboratory_code": laboratory.getCode(),
+        "laboratory_title": api.get_title(laboratory),
+        "laboratory_uid": api.get_uid(laboratory),
+        "shipment_id": api.get_id(shipment),
+        "shipment_uid": api.get_uid(shipment),
+        "referring_shipment_id": shipment.getShipmentID(),
+    }
+
+
+def get_shared_values(instance):
+    """Returns the index values the inbound sample passed-in has in common
+    with the rest of inbound samples from same shipment. Values are computed
+    only once when the inbound samples are cataloged in bulk
+    """
+    shipment = instance.getInboundShipment()
+    values = get_shared_index_values(api.get_uid(shipment))
+    if values is None:
+        values = get_shipment_values(shipment)
+    return values
+
+
 @indexer(IInboundSample, IInboundSampleCatalog)
 def date_sampled(instance):
     """Returns the date when the inbound sample was originally collected
@@ -36,24 +66,21 @@ def date_sampled(instance):
 def laboratory_code(instance):
     """Returns the code of the lab referring the inbound sample
     """
-    referring_laboratory = instance.getReferringLaboratory()
-    return referring_laboratory.getCode()
+    return get_shared_values(instance)["laboratory_code"]
 
 
 @indexer(IInboundSample, IInboundSampleCatalog)
 def laboratory_title(instance):
     """Returns the code of the lab referring the inbound sample
     """
-    referring_laboratory = instance.getReferringLaboratory()
-    return api.get_title(referring_laboratory)
+    return get_shared_values(instance)["laboratory_title"]
 
 
 @indexer(IInboundSample, IInboundSampleCatalog)
 def laboratory_uid(instance):
     """Returns the UID of the lab referring the inbound sample
     """
-    referring_laboratory = instance.getReferringLaboratory()
-    return api.get_uid(referring_laboratory)
+    return get_shared_values(instance)["laboratory_uid"]
 
 
 @indexer(IInboundSample, IInboundSampleCatalog)
@@ -95,35 +122,32 @@ def sample_uid(instance):
 def shipment_id(instance):
     """Returns the id of the shipment the inbound sample belongs to
     """
-    shipment = instance.getInboundShipment()
-    return api.get_id(shipment)
+    return get_shared_values(instance)["shipment_id"]
 
 
 @indexer(IInboundSample, IInboundSampleCatalog)
 def shipment_uid(instance):
     """Returns the id of the shipment the inbound sample belongs to
     """
-    shipment = instance.getInboundShipment()
-    return api.get_uid(shipment)
+    return get_shared_values(instance)["shipment_uid"]
 
 
 @indexer(IInboundSample, IInboundSampleCatalog)
 def inbound_sample_searchable_text(instance):
     """Index for searchable text queries
     """
-    laboratory = instance.getReferringLaboratory()
+    values = get_shared_values(instance)
     sample = instance.getSample()
     if sample:
         sample = api.get_id(sample)
 
-    shipment = instance.getInboundShipment()
     searchable_text_tokens = [
-        laboratory.getCode(),
-        api.get_title(laboratory),
+        values["laboratory_code"],
+        values["laboratory_title"],
         # id of the inbound shipment the sample belongs to
-        api.get_id(shipment),
+        values["shipment_id"],
         # original ID provided by the referring laboratory
-        shipment.getShipmentID(),
+        values["referring_shipment_id"],
         instance.getReferringID(),
         instance.getSampleType(),
         sample,
@@ -131,3 +155,111 @@ def inbound_sample_searchable_text(instance):
     ]
     searchable_text_tokens = filter(None, searchable_text_tokens)
     return u" ".join(searchable_text_tokens)
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_url(instance):
+    """Returns the url of the sample counterpart of the inbound sample, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_url(sample)
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_date_sampled(instance):
+    """Returns the date when the sample counterpart of the inbound sample was
+    collected, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return sample.getDateSampled()
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_review_state(instance):
+    """Returns the status of the sample counterpart of the inbound sample, if
+    any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_review_status(sample)
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def client_title(instance):
+    """Returns the title of the client the sample counterpart of the inbound
+    sample belongs to, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_title(sample.getClient())
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def client_url(instance):
+    """Returns the url of the client the sample counterpart of the inbound
+    sample belongs to, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_url(sample.getClient())
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_type(instance):
+    """Returns the sample type of the inbound sample, as provided by the
+    referring laboratory
+    """
+    return instance.getSampleType()
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_type_id(instance):
+    """Returns the id of the sample type of the sample counterpart of the
+    inbound sample, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_id(sample.getSampleType())
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def sample_type_url(instance):
+    """Returns the url of the sample type of the sample counterpart of the
+    inbound sample, if any
+    """
+    sample = instance.getSample()
+    if sample:
+        return api.get_url(sample.getSampleType())
+    return None
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def priority(instance):
+    """Returns the priority of the sample counterpart of the inbound sample or
+    the priority of the inbound sample if there is no counterpart yet
+    """
+    sample = instance.getSample()
+    if sample:
+        return sample.getPriority()
+    return instance.getPriority()
+
+
+@indexer(IInboundSample, IInboundSampleCatalog)
+def analyses(instance):
+    """Returns the keywords of the analyses from the sample counterpart of the
+    inbound sample or the keywords of the analyses requested by the referring
+    laboratory if there is no counterpart yet
+    """
+    sample = instance.getSample()
+    if not sample:
+        return instance.getAnalyses()
+    keywords = map(lambda an: an.getKeyword, sample.getAnalyses())
+    return list(collections.OrderedDict.fromkeys(keywords))
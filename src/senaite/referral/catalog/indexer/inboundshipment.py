@@ -21,6 +21,9 @@
 from plone.indexer import indexer
 from senaite.referral.interfaces import IInboundSampleShipment
 from senaite.referral.interfaces import IShipmentCatalog
+from senaite.referral.reception import get_reception_count
+from senaite.referral.reception import TOTAL
+from senaite.referral.utils import get_creator_fullname
 
 from bika.lims import api
 
@@ -33,6 +36,73 @@ def laboratory_uid(instance):
     return api.get_uid(lab)
 
 
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def laboratory_title(instance):
+    """Returns the title of the lab referring the inbound sample shipment
+    """
+    lab = instance.getReferringLaboratory()
+    return api.get_title(lab)
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def laboratory_code(instance):
+    """Returns the code of the lab referring the inbound sample shipment
+    """
+    lab = instance.getReferringLaboratory()
+    return lab.getCode()
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def laboratory_url(instance):
+    """Returns the url of the lab referring the inbound sample shipment
+    """
+    lab = instance.getReferringLaboratory()
+    return api.get_url(lab)
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def num_samples(instance):
+    """Returns the number of inbound samples of the inbound sample shipment
+    """
+    return get_reception_count(instance, TOTAL)
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def dispatched_date(instance):
+    """Returns the date when the inbound sample shipment was dispatched from
+    the referring laboratory
+    """
+    return instance.getDispatchedDateTime()
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def received_date(instance):
+    """Returns the date when the inbound sample shipment was received
+    """
+    return instance.getReceivedDateTime()
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def rejected_date(instance):
+    """Returns the date when the inbound sample shipment was rejected
+    """
+    return instance.getRejectedDateTime()
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def cancelled_date(instance):
+    """Returns the date when the inbound sample shipment was cancelled
+    """
+    return instance.getCancelledDateTime()
+
+
+@indexer(IInboundSampleShipment, IShipmentCatalog)
+def creator_fullname(instance):
+    """Returns the fullname of the user who created the inbound sample shipment
+    """
+    return get_creator_fullname(instance)
+
+
 @indexer(IInboundSampleShipment, IShipmentCatalog)
 def shipment_id(instance):
     """Returns the unique identifier provided by the referring laboratory for
@@ -21,6 +21,7 @@
 from plone.indexer import indexer
 from senaite.referral.interfaces import IOutboundSampleShipment
 from senaite.referral.interfaces import IShipmentCatalog
+from senaite.referral.utils import get_creator_fullname
 
 from bika.lims import api
 
@@ -33,6 +34,79 @@ def laboratory_uid(instance):
     return api.get_uid(reference_lab)
 
 
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def laboratory_title(instance):
+    """Returns the title of the destination laboratory for this shipment
+    """
+    reference_lab = instance.getReferenceLaboratory()
+    return api.get_title(reference_lab)
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def laboratory_code(instance):
+    """Returns the code of the destination laboratory for this shipment
+    """
+    reference_lab = instance.getReferenceLaboratory()
+    return reference_lab.getCode()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def laboratory_url(instance):
+    """Returns the url of the destination laboratory for this shipment
+    """
+    reference_lab = instance.getReferenceLaboratory()
+    return api.get_url(reference_lab)
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def num_samples(instance):
+    """Returns the number of samples assigned to this shipment
+    """
+    return len(instance.getRawSamples())
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def dispatched_date(instance):
+    """Returns the date when this shipment was dispatched
+    """
+    return instance.getDispatchedDateTime()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def delivered_date(instance):
+    """Returns the date when this shipment was delivered
+    """
+    return instance.getDeliveredDateTime()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def lost_date(instance):
+    """Returns the date when this shipment was labeled as lost
+    """
+    return instance.getLostDateTime()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def rejected_date(instance):
+    """Returns the date when this shipment was rejected
+    """
+    return instance.getRejectedDateTime()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def cancelled_date(instance):
+    """Returns the date when this shipment was cancelled
+    """
+    return instance.getCancelledDateTime()
+
+
+@indexer(IOutboundSampleShipment, IShipmentCatalog)
+def creator_fullname(instance):
+    """Returns the fullname of the user who created this shipment
+    """
+    return get_creator_fullname(instance)
+
+
 @indexer(IOutboundSampleShipment, IShipmentCatalog)
 def shipment_id(instance):
     """Returns the unique identifier of this Outbound Shipment
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from contextlib import contextmanager
+
+from bika.lims import api
+
+# Request key to flag that the indexing of objects is deferred
+DEFERRED_INDEXING_KEY = "_senaite_referral_deferred_indexing"
+
+# Request key where index values shared by multiple objects are stored
+SHARED_VALUES_KEY = "_senaite_referral_shared_index_values"
+
+
+def is_indexing_deferred():
+    """Returns whether the indexing of objects is deferred in current request
+    """
+    request = api.get_request()
+    if request is None:
+        return False
+    return request.get(DEFERRED_INDEXING_KEY, False) is True
+
+
+@contextmanager
+def deferred_indexing():
+    """Context manager that defers the indexing of the objects that support
+    it, so they can be cataloged afterwards in a single pass
+    """
+    request = api.get_request()
+    deferred = request.get(DEFERRED_INDEXING_KEY, False)
+    request.set(DEFERRED_INDEXING_KEY, True)
+    try:
+        yield
+    finally:
+        # Restore the previous value, indexing might be deferred by the caller
+        request.set(DEFERRED_INDEXING_KEY, deferred)
+
+
+def set_shared_index_values(key, values):
+    """Stores the index values shared by multiple objects for the rest of the
+    current request, so they are computed only once
+    """
+    request = api.get_request()
+    shared = request.get(SHARED_VALUES_KEY, None)
+    if shared is None:
+        shared = {}
+        request.set(SHARED_VALUES_KEY, shared)
+    shared[key] = values
+
+
+def del_shared_index_values(key):
+    """Removes the index values stored for the given key in current request
+    """
+    request = api.get_request()
+    shared = request.get(SHARED_VALUES_KEY, None) or {}
+    shared.pop(key, None)
+
+
+def get_shared_index_values(key):
+    """Returns the index values stored for the given key in current request,
+    if any
+    """
+    request = api.get_request()
+    if request is None:
+        return None
+    shared = request.get(SHARED_VALUES_KEY, None) or {}
+    return shared.get(key)
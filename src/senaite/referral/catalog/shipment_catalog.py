@@ -31,7 +31,16 @@ CATALOG_TITLE = "Senaite Shipment Catalog"
 
 INDEXES = BASE_INDEXES + [
     # id, indexed attribute, type
+    ("cancelled_date", "", "DateIndex"),
+    ("delivered_date", "", "DateIndex"),
+    ("dispatched_date", "", "DateIndex"),
+    ("laboratory_code", "", "FieldIndex"),
+    ("laboratory_title", "", "FieldIndex"),
     ("laboratory_uid", "", "FieldIndex"),
+    ("lost_date", "", "DateIndex"),
+    ("num_samples", "", "FieldIndex"),
+    ("received_date", "", "DateIndex"),
+    ("rejected_date", "", "DateIndex"),
     ("shipment_id", "", "FieldIndex"),
     ("shipment_searchable_text", "", "ZCTextIndex"),
     ("sortable_title", "", "FieldIndex"),
@@ -39,7 +48,18 @@ INDEXES = BASE_INDEXES + [
 
 COLUMNS = BASE_COLUMNS + [
     # attribute name
+    "cancelled_date",
+    "creator_fullname",
+    "delivered_date",
+    "dispatched_date",
+    "laboratory_code",
+    "laboratory_title",
     "laboratory_uid",
+    "laboratory_url",
+    "lost_date",
+    "num_samples",
+    "received_date",
+    "rejected_date",
     "shipment_id",
 ]
 
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import threading
+import time
+
+from requests import Response
+from senaite.referral import logger
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Number of consecutive failures that trip the breaker
+FAILURE_THRESHOLD = 3
+
+# Seconds to wait before a probe request is allowed after the breaker trips
+RECOVERY_TIMEOUT = 60
+
+# Seconds to wait for the outcome of a probe request before another probe is
+# allowed, in case the outcome of the former is never notified
+PROBE_TIMEOUT = 60
+
+# HTTP statuses that denote the remote laboratory is not reachable
+UNREACHABLE_STATUSES = [502, 503, 504]
+
+# Exceptions from requests that denote the remote laboratory is unreachable
+UNREACHABLE_REASONS = [
+    "ConnectionError",
+    "ConnectTimeout",
+    "ProxyError",
+    "ReadTimeout",
+    "SSLError",
+    "Timeout",
+]
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker(object):
+    """Keeps track of the failed attempts to reach a remote laboratory, so
+    no requests are sent while the laboratory is known to be unreachable
+    """
+
+    def __init__(self, key, threshold=FAILURE_THRESHOLD,
+                 recovery_timeout=RECOVERY_TIMEOUT,
+                 probe_timeout=PROBE_TIMEOUT):
+        self.key = key
+        self.threshold = threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_timeout = probe_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probed_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def probing(self):
+        """Returns whether a probe request is in progress
+        """
+        if self.probed_at is None:
+            return False
+        return time.time() - self.probed_at < self.probe_timeout
+
+    @property
+    def state(self):
+        """Returns the current state of the breaker
+        """
+        if self.opened_at is None:
+            return CLOSED
+        if self.probing or self.get_retry_in() <= 0:
+            return HALF_OPEN
+        return OPEN
+
+    def get_retry_in(self):
+        """Returns the seconds left before a probe request is allowed
+        """
+        if self.opened_at is None:
+            return 0
+        elapsed = time.time() - self.opened_at
+        return max(self.recovery_timeout - elapsed, 0)
+
+    def allow(self):
+        """Returns whether a request to the remote laboratory is allowed. Only
+        one probe request is allowed while the breaker is half-open
+        """
+        with self.lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self.probing:
+                self.probed_at = time.time()
+                return True
+            return False
+
+    def success(self):
+        """Notifies the breaker the remote laboratory responded. Returns
+        whether the breaker was closed as a result
+        """
+        with self.lock:
+            was_open = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+            self.probed_at = None
+        if was_open:
+            logger.info("Circuit breaker closed: {}".format(self.key))
+        return was_open
+
+    def failure(self):
+        """Notifies the breaker the remote laboratory was not reachable
+        """
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.time()
+                self.probed_at = None
+                logger.warn("Circuit breaker open: {}".format(self.key))
+
+
+def get_breaker(key):
+    """Returns the process-wide circuit breaker for the given key
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key)
+            _breakers[key] = breaker
+        return breaker
+
+
+def is_unreachable(response):
+    """Returns whether the response passed-in, either a requests' Response or
+    a dict-like object with the error information, denotes the remote
+    laboratory was not reachable
+    """
+    if isinstance(response, Response):
+        return response.status_code in UNREACHABLE_STATUSES
+    if response.get("reason") in UNREACHABLE_REASONS:
+        return True
+    return response.get("status") in UNREACHABLE_STATUSES
@@ -27,3 +27,6 @@ PRODUCT_TYPES = (
     "ExternalLaboratory",
     "ExternalLaboratoryFolder",
 )
+
+# Message of the error returned for actions the laboratory does not support
+UNSUPPORTED_ACTION = "Action not supported"
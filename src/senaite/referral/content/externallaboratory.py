@@ -31,6 +31,7 @@ from senaite.referral.content import set_bool_value
 from senaite.referral.content import set_string_value
 from senaite.referral.content import set_uids_field_value
 from senaite.referral.interfaces import IExternalLaboratory
+from senaite.referral.remotesession import invalidate_sessions
 from senaite.referral.utils import get_by_code
 from senaite.referral.utils import is_valid_code
 from senaite.referral.utils import is_valid_url
@@ -293,7 +294,10 @@ class ExternalLaboratory(Container):
             if url and not is_valid_url(url):
                 raise ValueError("URL is not valid")
 
+        old_url = self.getUrl()
         set_string_value(self, "url", value, validator=validate_url)
+        if old_url != self.getUrl():
+            invalidate_sessions(old_url)
 
     @security.protected(permissions.View)
     def getUrl(self):
@@ -307,7 +311,10 @@ class ExternalLaboratory(Container):
         SENAITE instance of the external laboratory in order to send POST
         requests
         """
+        old_username = self.getUsername()
         set_string_value(self, "username", value)
+        if old_username != self.getUsername():
+            invalidate_sessions(self.getUrl())
 
     @security.protected(permissions.View)
     def getUsername(self):
@@ -323,7 +330,10 @@ class ExternalLaboratory(Container):
         SENAITE instance of the external laboratory in order to send POST
         requests
         """
+        old_password = self.getPassword()
         set_string_value(self, "password", value)
+        if old_password != self.getPassword():
+            invalidate_sessions(self.getUrl())
 
     @security.protected(permissions.View)
     def getPassword(self):
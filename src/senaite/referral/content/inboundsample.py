@@ -25,6 +25,7 @@ from plone.supermodel import model
 from Products.CMFCore import permissions
 from senaite.referral import messageFactory as _
 from senaite.referral.catalog import INBOUND_SAMPLE_CATALOG
+from senaite.referral.catalog.indexing import is_indexing_deferred
 from senaite.referral.content import get_datetime_value
 from senaite.referral.content import get_string_list_value
 from senaite.referral.content import get_string_value
@@ -34,6 +35,7 @@ from senaite.referral.content import set_string_list_value
 from senaite.referral.content import set_string_value
 from senaite.referral.content import set_uids_field_value
 from senaite.referral.interfaces import IInboundSample
+from senaite.referral.reception import track_inbound_sample
 from senaite.referral.utils import get_action_date
 from zope import schema
 from zope.interface import implementer
@@ -163,6 +165,20 @@ class InboundSample(Container):
     security = ClassSecurityInfo()
     exclude_from_nav = True
 
+    def indexObject(self):
+        """Indexes the object, unless indexing is deferred
+        """
+        if is_indexing_deferred():
+            return
+        super(InboundSample, self).indexObject()
+
+    def reindexObject(self, idxs=None):
+        """Reindexes the object, unless indexing is deferred
+        """
+        if is_indexing_deferred():
+            return
+        super(InboundSample, self).reindexObject(idxs=idxs or [])
+
     def Title(self):
         """Returns the unique ID provided by the referring laboratory
         """
@@ -294,6 +310,9 @@ class InboundSample(Container):
         """
         set_uids_field_value(self, "sample", value)
 
+        # Update the reception counters of the shipment
+        track_inbound_sample(self)
+
     @security.protected(permissions.View)
     def getDateCreated(self):
         """Returns the datetime when this inbound sample was created
@@ -33,13 +33,18 @@ from senaite.referral.content import get_uids_field_value
 from senaite.referral.content import set_string_value
 from senaite.referral.content import set_uids_field_value
 from senaite.referral.interfaces import IOutboundSampleShipment
+from senaite.referral.orderedset import OrderedUIDSet
 from senaite.referral.utils import get_action_date
+from senaite.referral.utils import to_uids
 from zope import schema
 from zope.interface import implementer
 
 from bika.lims import api
 from bika.lims.interfaces import IAnalysisRequest
 
+# Attribute where the ordered set of sample uids is stored
+SAMPLES_STORAGE = "_samples"
+
 
 class IOutboundSampleShipmentSchema(model.Schema):
     """OutboundSampleShipment content schema
@@ -170,10 +175,27 @@ class OutboundSampleShipment(Container):
         """
         return get_action_date(self, "cancel_outbound_shipment", default=None)
 
+    def get_samples_storage(self, create=False):
+        """Returns the ordered set of sample uids assigned to this shipment.
+        If create, the set is created and filled with the samples from the
+        legacy list of uids, if any. Returns None otherwise
+        """
+        storage = getattr(self, SAMPLES_STORAGE, None)
+        if storage is None and create:
+            uids = get_uids_field_value(self, "samples")
+            storage = OrderedUIDSet(uids)
+            setattr(self, SAMPLES_STORAGE, storage)
+            set_uids_field_value(self, "samples", [])
+        return storage
+
     def getRawSamples(self):
         """Returns the list of sample uids assigned to this shipment
         """
-        return get_uids_field_value(self, "samples")
+        storage = self.get_samples_storage()
+        if storage is None:
+            # Legacy list of uids, not migrated yet
+            return get_uids_field_value(self, "samples")
+        return list(storage)
 
     def getSamples(self):
         """Returns the list of samples assigned to this shipment
@@ -184,35 +206,42 @@ class OutboundSampleShipment(Container):
     def setSamples(self, value):
         """Assigns the samples assigned to this shipment
         """
-        set_uids_field_value(self, "samples", value, validator=check_sample)
+        uids = to_uids(value)
+        storage = self.get_samples_storage(create=True)
+        self.removeSamples(filter(lambda uid: uid not in uids, storage))
+        self.addSamples(uids)
+
+    def addSamples(self, values):
+        """Adds the samples to this shipment. Only the samples that are not
+        yet assigned to this shipment are checked
+        """
+        storage = self.get_samples_storage(create=True)
+        uids = filter(lambda uid: uid not in storage, to_uids(values))
+        for uid in uids:
+            check_sample(uid)
+        for uid in uids:
+            storage.add(uid)
+
+    def removeSamples(self, values):
+        """Removes the samples from this shipment
+        """
+        storage = self.get_samples_storage(create=True)
+        for uid in to_uids(values):
+            storage.remove(uid)
 
     def addSample(self, value):
         """Adds a sample to this shipment
         """
         if not value:
             return
-
-        uids = self.getRawSamples()
-        sample_uid = api.get_uid(value)
-        if sample_uid in uids:
-            return
-
-        uids.append(sample_uid)
-        self.setSamples(uids)
+        self.addSamples([value])
 
     def removeSample(self, value):
         """Removes a sample from this shipment
         """
         if not value:
             return
-
-        uids = self.getRawSamples()
-        sample_uid = api.get_uid(value)
-        if sample_uid not in uids:
-            return
-
-        uids.pop(sample_uid)
-        self.setSamples(uids)
+        self.removeSamples([value])
 
     def in_preparation(self):
         """Return whether the status of the shipment is "preparation"
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.referral import check_installed
+from senaite.referral.catalog import INBOUND_SAMPLE_CATALOG
+
+from bika.lims import api
+from bika.lims.interfaces import IAnalysisRequest
+
+
+def reindex_inbound_samples(sample):
+    """Reindexes the inbound samples the sample passed-in is the counterpart
+    of, so their catalog metadata with the information of the sample is kept
+    up-to-date
+    """
+    if not IAnalysisRequest.providedBy(sample):
+        return
+    if not sample.hasInboundShipment():
+        return
+
+    query = {"sample_uid": api.get_uid(sample)}
+    for brain in api.search(query, INBOUND_SAMPLE_CATALOG):
+        inbound_sample = api.get_object(brain)
+        inbound_sample.reindexObject(idxs=["sample_uid"])
+
+
+@check_installed(None)
+def on_modified(sample, event):
+    """Event handler for when a sample is modified
+    """
+    reindex_inbound_samples(sample)
+
+
+@check_installed(None)
+def on_transitioned(sample, event):
+    """Event handler for when a sample is transitioned
+    """
+    reindex_inbound_samples(sample)
+
+
+@check_installed(None)
+def on_analysis_added(analysis, event):
+    """Event handler for when an analysis is added to a sample
+    """
+    reindex_inbound_samples(event.newParent)
+
+
+@check_installed(None)
+def on_analysis_removed(analysis, event):
+    """Event handler for when an analysis is removed from a sample
+    """
+    reindex_inbound_samples(event.oldParent)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.referral.catalog import SHIPMENT_CATALOG
+from senaite.referral.remotesession import invalidate_sessions
+from senaite.referral.utils import remove_laboratory_code
+from senaite.referral.utils import set_laboratory_code
+
+from bika.lims import api
+
+# Fields that, when modified, render pooled sessions to the lab obsolete
+CONNECTIVITY_FIELDS = ["url", "username", "password"]
+
+# Fields that, when modified, render the catalog entries of the shipments
+# from or to the lab obsolete
+SHIPMENT_FIELDS = ["title", "code"]
+
+# Shipment catalog indexes that depend on the title or code of the lab
+SHIPMENT_INDEXES = [
+    "laboratory_code",
+    "laboratory_title",
+    "shipment_searchable_text",
+]
+
+
+def get_modified_fields(event):
+    """Returns the names of the fields modified in the event passed-in
+    """
+    fields = []
+    for description in getattr(event, "descriptions", None) or []:
+        attributes = getattr(description, "attributes", None) or []
+        for attribute in attributes:
+            # z3c.form prefixes the field names with the schema name
+            fields.append(attribute.split(".")[-1])
+    return fields
+
+
+def on_added(laboratory, event):
+    """Event handler for when an ExternalLaboratory is added. Registers the
+    code of the laboratory in the lookup table
+    """
+    set_laboratory_code(laboratory)
+
+
+def on_removed(laboratory, event):
+    """Event handler for when an ExternalLaboratory is removed. Removes the
+    code of the laboratory from the lookup table
+    """
+    remove_laboratory_code(laboratory)
+
+
+def on_modified(laboratory, event):
+    """Event handler for when an ExternalLaboratory is modified. Updates the
+    code of the laboratory in the lookup table, reindexes the shipments from
+    or to the laboratory if the title or code changed and discards the pooled
+    HTTP sessions to the laboratory if the connectivity changed. Edit forms
+    set the attributes directly, without the setters of the object
+    """
+    set_laboratory_code(laboratory)
+
+    fields = get_modified_fields(event)
+    if not fields:
+        # No details about the changes, assume the worst
+        reindex_shipments(laboratory)
+        invalidate_sessions(laboratory.getUrl())
+        return
+
+    if any([field in SHIPMENT_FIELDS for field in fields]):
+        reindex_shipments(laboratory)
+
+    if "url" in fields:
+        # we do not know the previous URL anymore
+        invalidate_sessions()
+
+    elif any([field in CONNECTIVITY_FIELDS for field in fields]):
+        invalidate_sessions(laboratory.getUrl())
+
+
+def reindex_shipments(laboratory):
+    """Reindexes the shipments from or to the laboratory passed-in, so the
+    title and code of the laboratory are up-to-date in the catalog
+    """
+    query = {"laboratory_uid": api.get_uid(laboratory)}
+    for brain in api.search(query, SHIPMENT_CATALOG):
+        shipment = api.get_object(brain)
+        shipment.reindexObject(idxs=SHIPMENT_INDEXES)
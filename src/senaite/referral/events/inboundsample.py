@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.referral.catalog.indexing import is_indexing_deferred
+from senaite.referral.reception import track_inbound_sample
+from senaite.referral.reception import untrack_inbound_sample
+
+
+def on_added(inbound_sample, event):
+    """Event handler for when an InboundSample is added. Updates the reception
+    counters of the shipment the inbound sample belongs to
+    """
+    shipment = event.newParent
+    track_inbound_sample(inbound_sample, shipment=shipment)
+
+    # Samples created in bulk are counted once all of them are created
+    if not is_indexing_deferred():
+        shipment.reindexObject(idxs=["num_samples"])
+
+
+def on_removed(inbound_sample, event):
+    """Event handler for when an InboundSample is removed. Removes the inbound
+    sample from the reception counters of the shipment it belonged to
+    """
+    shipment = event.oldParent
+    untrack_inbound_sample(inbound_sample, shipment=shipment)
+
+    # Skip the reindex if the shipment itself is being removed
+    if event.object is inbound_sample:
+        shipment.reindexObject(idxs=["num_samples"])
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.referral import check_installed
+from senaite.referral.notifications import unindex_notifications
+
+
+@check_installed(None)
+def on_removed(obj, event):
+    """Event handler for when an object remote laboratories might have been
+    notified about is removed. Removes the object from the index of statuses
+    of notifications, so it is no longer listed as failed nor retried
+    """
+    unindex_notifications(obj)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import functools
+import json
+import random
+import time
+
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from persistent import Persistent
+from zope.annotation.interfaces import IAnnotations
+
+from bika.lims import api
+
+PROCESSED_KEYS_STORAGE = "senaite.referral.processed_keys"
+
+# Name of the payload key with the idempotency key of a push
+IDEMPOTENCY_KEY = "idempotency_key"
+
+# Seconds the outcome of a push is kept for replays
+KEYS_TTL = 7 * 24 * 60 * 60
+
+# Max number of expired keys removed each time the store is purged
+PURGE_BATCH = 100
+
+# Probability of purging the expired keys when a new key is stored. Purging
+# on every push would make concurrent pushes remove the same keys, and the
+# conflict cannot be resolved
+PURGE_PROBABILITY = 0.1
+
+
+class ProcessedKeys(Persistent):
+    """Time-bounded store of the idempotency keys of the pushes processed
+    already, along with their outcome
+    """
+
+    def __init__(self):
+        # key -> tuple of (processed time, JSON-encoded result)
+        self.records = OOBTree()
+        # tuples of (processed time, key), sorted from oldest to newest
+        self.expiry = OOTreeSet()
+
+    def get(self, key, now=None):
+        """Returns a tuple (True, result) for the key passed-in if processed
+        and not expired yet. Returns (False, None) otherwise
+        """
+        record = self.records.get(key)
+        if not record:
+            return False, None
+        now = now or time.time()
+        processed, result = record
+        if now - processed > KEYS_TTL:
+            return False, None
+        return True, json.loads(result)
+
+    def add(self, key, result, now=None):
+        """Stores the result for the key passed-in and purges expired keys
+        from time to time
+        """
+        now = now or time.time()
+        old_record = self.records.get(key)
+        if old_record:
+            self.expiry.remove((old_record[0], key))
+        self.records[key] = (now, json.dumps(result))
+        self.expiry.insert((now, key))
+        if random.random() < PURGE_PROBABILITY:
+            self.purge(now=now)
+
+    def purge(self, now=None, limit=PURGE_BATCH):
+        """Removes up to limit expired keys, oldest first
+        """
+        now = now or time.time()
+        expired = []
+        for processed, key in self.expiry:
+            if len(expired) >= limit or now - processed <= KEYS_TTL:
+                break
+            expired.append((processed, key))
+
+        for processed, key in expired:
+            self.expiry.remove((processed, key))
+            del self.records[key]
+
+
+def get_processed_keys(portal=None):
+    """Returns the store of processed idempotency keys
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(PROCESSED_KEYS_STORAGE) is None:
+        annotation[PROCESSED_KEYS_STORAGE] = ProcessedKeys()
+    return annotation[PROCESSED_KEYS_STORAGE]
+
+
+def get_idempotency_key(record):
+    """Returns the idempotency key of the push record passed-in, scoped to the
+    laboratory that sent the push, or None
+    """
+    key = record.get(IDEMPOTENCY_KEY)
+    if not key:
+        return None
+    return "{}:{}".format(record.get("lab_code") or "", key)
+
+
+def idempotent(func):
+    """Decorator for the process function of push consumers. Returns the
+    outcome of the push processed earlier with same idempotency key, if any,
+    without processing it again. The outcome is stored within the same
+    transaction the push is processed in
+    """
+    @functools.wraps(func)
+    def wrapper(self):
+        key = get_idempotency_key(self.data)
+        if not key:
+            return func(self)
+
+        store = get_processed_keys()
+        processed, result = store.get(key)
+        if processed:
+            return result
+
+        result = func(self)
+        store.add(key, result)
+        return result
+    return wrapper
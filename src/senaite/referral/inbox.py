@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import functools
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from Acquisition import aq_base
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from persistent.mapping import PersistentMapping
+from senaite.jsonapi.interfaces import IPushConsumer
+from senaite.referral import logger
+from senaite.referral.idempotency import PURGE_BATCH
+from senaite.referral.idempotency import PURGE_PROBABILITY
+from senaite.referral.utils import get_by_code
+from senaite.referral.utils import is_true
+from senaite.referral.worker import commit
+from senaite.referral.worker import schedule_in_site
+from senaite.referral.worker import submit_in_site
+from zope.annotation.interfaces import IAnnotations
+from zope.component import queryAdapter
+
+from bika.lims import api
+
+try:
+    from senaite.queue.api import add_task
+    from senaite.queue.api import is_queue_ready
+except ImportError:
+    # Queue is not installed
+    is_queue_ready = None
+
+INBOX_STORAGE = "senaite.referral.inbox"
+
+# Storage of the finished receipts, sorted from oldest to newest
+INBOX_EXPIRY_STORAGE = "senaite.referral.inbox_expiry"
+
+# Seconds finished receipts are kept before being purged
+RECEIPTS_TTL = 7 * 24 * 60 * 60
+
+# Name of the senaite.queue task that processes an accepted push
+RECEIPT_TASK = "task_referral_receipt"
+
+# Seconds a receipt not handled by senaite.queue can remain queued before it
+# is considered lost (e.g. because of a restart) and submitted again
+QUEUED_TIMEOUT = 300
+
+# Seconds between two consecutive scans of lost receipts
+SCAN_INTERVAL = 60
+
+# Receipt statuses
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+_dispatchers = set()
+
+
+def get_inbox_storage(portal=None):
+    """Returns the storage of the pushes accepted for async processing
+    :returns: OOBTree of receipt id -> PersistentMapping
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(INBOX_STORAGE) is None:
+        annotation[INBOX_STORAGE] = OOBTree()
+    return annotation[INBOX_STORAGE]
+
+
+def get_inbox_expiry(portal=None):
+    """Returns the tuples of (finished time, receipt id) of the receipts
+    that are either done or failed, sorted from oldest to newest
+    :returns: OOTreeSet of (finished time, receipt id)
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(INBOX_EXPIRY_STORAGE) is None:
+        annotation[INBOX_EXPIRY_STORAGE] = OOTreeSet()
+    return annotation[INBOX_EXPIRY_STORAGE]
+
+
+def get_receipt(receipt_id, portal=None):
+    """Returns the receipt with the given id or None
+    """
+    if not receipt_id:
+        return None
+    storage = get_inbox_storage(portal=portal)
+    return storage.get(receipt_id)
+
+
+def get_receipt_info(receipt):
+    """Returns a dict representation of the receipt passed-in, without the
+    payload, suitable for being returned to the sender
+    """
+    return {
+        "receipt_id": receipt["id"],
+        "status": receipt["status"],
+        "error": receipt.get("error"),
+        "created": receipt["created"],
+        "modified": receipt["modified"],
+    }
+
+
+def set_receipt_status(receipt_id, status, error=None, portal=None):
+    """Sets the status of the receipt with the given id
+    """
+    receipt = get_receipt(receipt_id, portal=portal)
+    if not receipt:
+        return
+    receipt.update({
+        "status": status,
+        "error": error,
+        "modified": time.time(),
+    })
+    if status in [DONE, FAILED]:
+        finish_receipt(receipt, portal=portal)
+
+
+def finish_receipt(receipt, portal=None):
+    """Flags the receipt passed-in for its removal once expired and purges
+    the receipts expired already from time to time. The payload is no longer
+    needed if the receipt is done, so it is removed right away
+    """
+    if receipt["status"] == DONE:
+        receipt["payload"] = None
+
+    expiry = get_inbox_expiry(portal=portal)
+    expiry.insert((receipt["modified"], receipt["id"]))
+    if random.random() < PURGE_PROBABILITY:
+        purge_receipts(portal=portal)
+
+
+def purge_receipts(now=None, limit=PURGE_BATCH, portal=None):
+    """Removes up to limit finished receipts that expired, oldest first
+    """
+    now = now or time.time()
+    expiry = get_inbox_expiry(portal=portal)
+    expired = []
+    for finished, receipt_id in expiry:
+        if len(expired) >= limit or now - finished <= RECEIPTS_TTL:
+            break
+        expired.append((finished, receipt_id))
+
+    storage = get_inbox_storage(portal=portal)
+    for finished, receipt_id in expired:
+        expiry.remove((finished, receipt_id))
+
+        # Keep the receipt if the sender pushed it again after it failed
+        receipt = storage.get(receipt_id)
+        if receipt and receipt["modified"] == finished:
+            del storage[receipt_id]
+
+
+def is_async(record):
+    """Returns whether the push record passed-in asks for async processing
+    """
+    return is_true(record.get("async", False))
+
+
+def accept(record, consumer):
+    """Stores the push record passed-in in the inbox and schedules its
+    processing with the given consumer name. Returns the receipt id
+    """
+    lab_code = record.get("lab_code")
+    laboratory = get_by_code("ExternalLaboratory", lab_code)
+    if not laboratory:
+        raise ValueError("Laboratory not found: {}".format(lab_code))
+    if not api.is_active(laboratory):
+        raise ValueError("Laboratory is not active: {}".format(lab_code))
+
+    receipt_id = record.get("receipt_id") or uuid4().hex
+    receipt = get_receipt(receipt_id)
+    if receipt and receipt["status"] != FAILED:
+        # The sender is retrying a push we accepted already
+        return receipt_id
+
+    payload = dict(record)
+    payload.pop("async", None)
+    payload["receipt_id"] = receipt_id
+
+    storage = get_inbox_storage()
+    storage[receipt_id] = PersistentMapping({
+        "id": receipt_id,
+        "consumer": consumer,
+        "laboratory": api.get_uid(laboratory),
+        "payload": json.dumps(payload),
+        "user_id": api.get_current_user().getId(),
+        "created": datetime.now().isoformat(),
+        "status": QUEUED,
+        "error": None,
+        "modified": time.time(),
+    })
+
+    if callable(is_queue_ready) and is_queue_ready():
+        # queue is installed and ready
+        add_task(RECEIPT_TASK, laboratory, receipt_id=receipt_id)
+        storage[receipt_id]["task"] = True
+    else:
+        dispatch_after_commit(receipt_id)
+
+    return receipt_id
+
+
+def accept_async(func):
+    """Decorator for the process function of push consumers. Stores the push
+    in the inbox and returns right away with the receipt id when the sender
+    asks for async processing. The push is processed later, in the background
+    """
+    @functools.wraps(func)
+    def wrapper(self):
+        record = self.data
+        if not is_async(record):
+            return func(self)
+        receipt_id = accept(record, record.get("consumer"))
+        return {"receipt_id": receipt_id}
+    return wrapper
+
+
+def dispatch_after_commit(receipt_id):
+    """Schedules the processing of the receipt passed-in by the background
+    workers for when the current transaction is successfully committed
+    """
+    portal = api.get_portal()
+    db = portal._p_jar.db()
+    site_path = api.get_path(portal)
+
+    def after_commit(status):
+        if not status:
+            return
+        submit_in_site(db, site_path, process_receipt, receipt_id)
+
+        # Be sure the receipts lost by a restart are processed
+        schedule_in_site(db, site_path, dispatch_queued, SCAN_INTERVAL)
+        _dispatchers.add(site_path)
+
+    transaction.get().addAfterCommitHook(after_commit)
+
+
+def start_dispatcher(portal):
+    """Starts the periodic dispatch of the queued receipts that were lost in
+    the portal passed-in, if not started yet in this process
+    """
+    site_path = api.get_path(portal)
+    if site_path in _dispatchers:
+        return
+
+    # Nothing to dispatch if no push was ever accepted
+    if IAnnotations(portal).get(INBOX_STORAGE) is None:
+        return
+
+    db = portal._p_jar.db()
+    schedule_in_site(db, site_path, dispatch_queued, SCAN_INTERVAL)
+    _dispatchers.add(site_path)
+
+
+def dispatch_queued(portal, now=None):
+    """Delegates the processing of the receipts that have been queued for too
+    long to the background workers. These are receipts that were only kept
+    in the memory of the workers when the instance was restarted. Receipts
+    handled by senaite.queue are not considered, the queue keeps its tasks
+    """
+    now = now or time.time()
+    db = portal._p_jar.db()
+    site_path = api.get_path(portal)
+    storage = get_inbox_storage(portal=portal)
+    for receipt in storage.values():
+        if receipt["status"] != QUEUED or receipt.get("task"):
+            continue
+        if receipt["id"] in _inflight:
+            continue
+        if now - receipt["modified"] < QUEUED_TIMEOUT:
+            continue
+        submit_in_site(db, site_path, process_receipt, receipt["id"])
+
+
+def run_receipt(receipt_id, portal=None):
+    """Processes the push of the receipt passed-in with its consumer and
+    flags the receipt as done. Does not commit the transaction
+    """
+    receipt = get_receipt(receipt_id, portal=portal)
+    if not receipt or receipt["status"] != QUEUED:
+        return
+
+    record = json.loads(receipt["payload"])
+    name = receipt["consumer"]
+    consumer = queryAdapter(record, IPushConsumer, name=name)
+    if consumer is None:
+        raise ValueError("No consumer registered for name={}".format(name))
+
+    consumer.process()
+    set_receipt_status(receipt_id, DONE, portal=portal)
+
+
+def process_receipt(portal, receipt_id):
+    """Processes the push of the receipt passed-in as the user that sent it,
+    and commits the result. The receipt is flagged as failed if the consumer
+    cannot process the push
+    """
+    with _inflight_lock:
+        if receipt_id in _inflight:
+            return
+        _inflight.add(receipt_id)
+    try:
+        _process_receipt(portal, receipt_id)
+    finally:
+        with _inflight_lock:
+            _inflight.discard(receipt_id)
+
+
+def _process_receipt(portal, receipt_id):
+    receipt = get_receipt(receipt_id, portal=portal)
+    if not receipt or receipt["status"] != QUEUED:
+        return
+
+    # Run as the user that sent the push
+    user = get_user(portal, receipt["user_id"])
+    if user is None:
+        error = "User not found: {}".format(receipt["user_id"])
+        commit(fail_receipt, receipt_id, error, portal=portal)
+        return
+    newSecurityManager(None, user)
+
+    try:
+        if commit(run_receipt, receipt_id, portal=portal):
+            return
+        error = "ConflictError"
+    except Exception as e:
+        error = get_error_message(e)
+
+    commit(fail_receipt, receipt_id, error, portal=portal)
+
+
+def fail_receipt(receipt_id, error, portal=None):
+    """Discards the changes made while processing the receipt passed-in and
+    flags the receipt as failed, unless processed already elsewhere. Does not
+    commit the transaction
+    """
+    transaction.abort()
+    logger.error("Cannot process receipt {}: {}".format(receipt_id, error))
+    receipt = get_receipt(receipt_id, portal=portal)
+    if not receipt or receipt["status"] != QUEUED:
+        return
+    set_receipt_status(receipt_id, FAILED, error=error, portal=portal)
+
+
+def get_user(portal, user_id):
+    """Returns the user with the given id, wrapped in the user folder it was
+    found, either the portal's or the root's one. Returns None otherwise
+    """
+    user_folders = [portal.acl_users, portal.getPhysicalRoot().acl_users]
+    for acl_users in user_folders:
+        user = acl_users.getUserById(user_id)
+        if user is not None:
+            return aq_base(user).__of__(acl_users)
+    return None
+
+
+def get_error_message(exception):
+    """Returns the error message to store in a receipt for the exception
+    """
+    return "{}: {}".format(type(exception).__name__, str(exception))
@@ -96,3 +96,14 @@ class IInboundSampleCatalog(ISenaiteReferralCatalogObject):
 class IShipmentCatalog(ISenaiteReferralCatalogObject):
     """Marker interface for Shipment Catalog
     """
+
+
+class IReferralObjectInfo(Interface):
+    """Adapter that returns the minimal representation of an object to be
+    sent to a remote laboratory in a POST payload. Adapters can be registered
+    with the name of the action the payload is about
+    """
+
+    def to_dict(self):
+        """Returns a dict representation of the object
+        """
@@ -17,3 +17,6 @@
 #
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
+
+# Register the JSON API routes
+from senaite.referral.jsonapi import routes  # noqa
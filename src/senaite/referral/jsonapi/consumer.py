@@ -18,6 +18,7 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+import collections
 import copy
 
 import json
@@ -25,6 +26,10 @@ from plone.memoize.instance import memoize
 from senaite.jsonapi.interfaces import IPushConsumer
 from senaite.referral import utils
 from senaite.referral.catalog import SHIPMENT_CATALOG
+from senaite.referral.config import UNSUPPORTED_ACTION
+from senaite.referral.idempotency import idempotent
+from senaite.referral.inbox import accept_async
+from senaite.referral.jsonapi.outboundsample import OutboundSampleConsumer
 from senaite.referral.workflow import change_workflow_state
 from zope.interface import implementer
 
@@ -79,6 +84,9 @@ class ReferralConsumer(BaseConsumer):
     """Handles push requests for name senaite.referral.consumer
     """
 
+    _samples = None
+    _shipments = None
+
     @property
     def items(self):
         return self.get_value(self.data, "items")
@@ -96,6 +104,8 @@ class ReferralConsumer(BaseConsumer):
         """
         return utils.get_by_code("ExternalLaboratory", self.lab_code)
 
+    @accept_async
+    @idempotent
     def process(self):
         """Processes the data sent via POST in accordance with the value for
         'action' parameter of the POST request
@@ -118,6 +128,9 @@ class ReferralConsumer(BaseConsumer):
         # see https://github.com/senaite/senaite.referral/pull/21
         default_action = self.get_value(self.data, "action", default=None)
 
+        # Resolve the counterpart objects of all items beforehand
+        self.resolve_objects(self.items)
+
         # Iterate through items and process them
         for item in self.items:
 
@@ -146,6 +159,13 @@ class ReferralConsumer(BaseConsumer):
         obj.setRejectionReasons(rejection_reasons)
         self.do_action(obj, "reject_at_reference")
 
+    def do_analysisrequest_update_analyses(self, item):
+        """Updates the analyses of a referred sample with the results from the
+        reference laboratory
+        """
+        consumer = OutboundSampleConsumer({"sample": item.get("sample")})
+        consumer.process()
+
     def do_inboundsampleshipment_reject(self, item):
         """Rejects the counterpart outbound shipment at local instance, and
         transitions its samples to 'Rejected at reference' as well
@@ -180,17 +200,23 @@ class ReferralConsumer(BaseConsumer):
 
         # Do force the transition
         # TODO Remove force the transition
+        supported = False
         workflows = api.get_workflows_for(obj)
         wf_tool = api.get_tool("portal_workflow")
         for wf_id in workflows:
             workflow = wf_tool.getWorkflowById(wf_id)
             if action not in workflow.transitions:
                 continue
+            supported = True
             transition = workflow.transitions[action]
             status = transition.new_state_id
             kwargs = {"action": action}
             change_workflow_state(obj, wf_id, status, **kwargs)
 
+        if not supported:
+            # Let the sender know, so it can fall back to other actions
+            raise ValueError("{}: {}".format(UNSUPPORTED_ACTION, action))
+
     def get_counterpart_type(self, portal_type):
         """Returns the counterpart type for the portal type passed in
         """
@@ -222,6 +248,95 @@ class ReferralConsumer(BaseConsumer):
 
         raise ValueError("Type is not supported: {}".format(item_type))
 
+    def resolve_objects(self, items):
+        """Resolves the counterpart objects from current instance of the items
+        passed-in in bulk, with a single search per catalog, so the handlers
+        of each item do not need to search for them one by one
+        """
+        sample_ids = set()
+        shipment_ids = collections.defaultdict(set)
+        for item in items:
+            item_type = item.get("portal_type")
+            portal_type = self.get_counterpart_type(item_type)
+            if portal_type == "AnalysisRequest":
+                original_id = self.get_original_id(item)
+                if original_id:
+                    sample_ids.add(original_id)
+            elif portal_type in ["OutboundSampleShipment",
+                                 "InboundSampleShipment"]:
+                shipment_id = item.get("shipment_id")
+                if shipment_id:
+                    shipment_ids[portal_type].add(shipment_id)
+
+        self._samples = self.resolve_samples(list(sample_ids))
+        self._shipments = self.resolve_shipments(shipment_ids)
+
+    def resolve_samples(self, sample_ids):
+        """Returns a dict of original id -> sample from current instance for
+        the ids passed-in. Invalidated samples are replaced by their retests.
+        Ids without a unique match are not included
+        """
+        if not sample_ids:
+            return {}
+
+        query = {
+            "portal_type": "AnalysisRequest",
+            "id": sample_ids,
+        }
+        brains = api.search(query, CATALOG_ANALYSIS_REQUEST_LISTING)
+        grouped = collections.defaultdict(list)
+        for brain in brains:
+            grouped[api.get_id(brain)].append(brain)
+
+        samples = dict([(sample_id, api.get_object(matches[0]))
+                        for sample_id, matches in grouped.items()
+                        if len(matches) == 1])
+
+        # If the sample is invalidated, use the retest instead
+        return self.resolve_retests(samples)
+
+    def resolve_retests(self, samples):
+        """Replaces the invalidated samples from the dict of original id ->
+        sample passed-in by their retests, following the chain of retests.
+        Samples without retest are not included in the returned dict
+        """
+        for sample_id, sample in samples.items():
+            while sample and self.is_invalidated(sample):
+                sample = sample.getRetest()
+            if sample:
+                samples[sample_id] = sample
+            else:
+                samples.pop(sample_id)
+        return samples
+
+    def resolve_shipments(self, shipment_ids):
+        """Returns a dict of (portal_type, shipment_id) -> shipment from
+        current instance for the dict of portal_type -> shipment ids passed-in.
+        Shipment ids without a unique match are not included
+        """
+        if not shipment_ids:
+            return {}
+
+        laboratory = self.get_laboratory()
+        ids = set()
+        for values in shipment_ids.values():
+            ids.update(values)
+
+        query = {
+            "portal_type": shipment_ids.keys(),
+            "shipment_id": list(ids),
+            "laboratory_uid": api.get_uid(laboratory),
+        }
+        brains = api.search(query, SHIPMENT_CATALOG)
+        grouped = collections.defaultdict(list)
+        for brain in brains:
+            key = (brain.portal_type, brain.shipment_id)
+            grouped[key].append(brain)
+
+        return dict([(type_id, api.get_object(matches[0]))
+                     for type_id, matches in grouped.items()
+                     if len(matches) == 1])
+
     def get_shipment_for(self, item):
         """Returns the InboundSampleShipment or OutboundSampleShipment object
         from current instance that is related with the information provided in
@@ -235,6 +350,12 @@ class ReferralConsumer(BaseConsumer):
         item_type = self.get_value(item, "portal_type")
         portal_type = self.get_counterpart_type(item_type)
 
+        # shipment might have been resolved beforehand
+        shipments = self._shipments or {}
+        shipment = shipments.get((portal_type, shipment_id))
+        if shipment:
+            return shipment
+
         laboratory = self.get_laboratory()
         query = {
             "portal_type": portal_type,
@@ -251,11 +372,16 @@ class ReferralConsumer(BaseConsumer):
         """Returns the AnalysisRequest object from current instance that is
         related with the information provided in the item passed-in, if any
         """
-        original_id = self.get_value(item, "ClientSampleID", default=None)
-        original_id = self.get_value(item, "referring_id", default=original_id)
+        original_id = self.get_original_id(item)
         if not original_id:
             raise ValueError("No ClientSampleID or referring_id")
 
+        # sample might have been resolved beforehand
+        samples = self._samples or {}
+        sample = samples.get(original_id)
+        if sample:
+            return sample
+
         query = {
             "portal_type": "AnalysisRequest",
             "id": original_id
@@ -275,6 +401,13 @@ class ReferralConsumer(BaseConsumer):
 
         return sample
 
+    def get_original_id(self, item):
+        """Returns the id of the sample at current instance the item passed-in
+        refers to
+        """
+        original_id = self.get_value(item, "ClientSampleID", default=None)
+        return self.get_value(item, "referring_id", default=original_id)
+
     def is_invalidated(self, sample):
         """Returns whether the sample was invalidated in present laboratory
         or at reference laboratory
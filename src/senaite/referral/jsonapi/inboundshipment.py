@@ -27,6 +27,21 @@ from senaite.jsonapi.interfaces import IPushConsumer
 from senaite.jsonapi.request import is_json_deserializable
 from senaite.referral import utils
 from senaite.referral.catalog import SHIPMENT_CATALOG
+from senaite.referral.catalog.indexer.inboundsample import get_shipment_values
+from senaite.referral.catalog.indexing import deferred_indexing
+from senaite.referral.catalog.indexing import del_shared_index_values
+from senaite.referral.catalog.indexing import set_shared_index_values
+from senaite.referral.idempotency import idempotent
+from senaite.referral.inbox import accept_async
+from senaite.referral.transfer import COMMIT
+from senaite.referral.transfer import commit_transfer
+from senaite.referral.transfer import get_missing_pages
+from senaite.referral.transfer import is_page_received
+from senaite.referral.transfer import is_transfer_in_progress
+from senaite.referral.transfer import OPEN
+from senaite.referral.transfer import PAGE
+from senaite.referral.transfer import set_page_received
+from senaite.referral.transfer import start_transfer
 from zope.annotation.interfaces import IAnnotations
 from zope.interface import implementer
 
@@ -44,33 +59,36 @@ class InboundShipmentConsumer(object):
     def __init__(self, data):
         self.data = data
 
+    @accept_async
+    @idempotent
     def process(self):
         """Processes the data sent via POST. Imports the inbound shipment by
-        creating the necessary samples and analyses
+        creating the necessary samples and analyses. Large shipments are
+        received in multiple steps (open, page and commit), each one in its
+        own POST request
         """
         # Sanitize the data first
         self.sanitize(self.data)
 
+        transfer = self.data.get("transfer")
+        if transfer == OPEN:
+            return self.process_open()
+        elif transfer == PAGE:
+            return self.process_page()
+        elif transfer == COMMIT:
+            return self.process_commit()
+        elif transfer:
+            raise ValueError("Transfer step not supported: {}".format(transfer))
+
         # Validate the data passed-in
         required_fields = ["lab_code", "shipment_id", "dispatched", "samples"]
         self.validate(self.data, required=required_fields)
 
         # Ensure the samples passed-in are compliant
-        required_fields = ["id", "date_sampled", "sample_type"]
-        sample_records = self.data.get("samples")
-        if isinstance(sample_records, six.string_types):
-            if not is_json_deserializable(sample_records):
-                raise ValueError("Value for 'samples' is not a valid JSON")
-            sample_records = json.loads(sample_records)
-        self.validate(sample_records, required=required_fields)
+        sample_records = self.get_sample_records()
 
         # XXX translate sample info (e.g. SampleType) to UIDs
 
-        dispatched = self.data.get("dispatched")
-        dispatched_date = api.to_date(dispatched)
-        if not dispatched_date:
-            raise ValueError("Non-valid datetime format: {}".format(dispatched))
-
         # Get the lab for the given code
         lab_code = self.data.get("lab_code")
         lab = self.get_external_laboratory(lab_code)
@@ -84,18 +102,8 @@ class InboundShipmentConsumer(object):
 
         # Create the Inbound Shipment and the Inbound Samples
         # TODO Performance - convert to queue task
-        comments = self.data.get("comments", "")
-        values = {
-            "shipment_id": str(shipment_id),
-            "referring_laboratory": api.get_uid(lab),
-            "referring_client": lab.getReferringClient(),
-            "comments": str(comments),
-            "dispatched_datetime": DT2dt(dispatched_date),
-            "samples": sample_records,
-        }
-        shipment = api.create(lab, "InboundSampleShipment", **values)
-        for record in sample_records:
-            self.create_inbound_sample(shipment, record)
+        shipment = self.create_inbound_shipment(lab, samples=sample_records)
+        self.create_inbound_samples(shipment, sample_records)
 
         # Disallow the "Add portal content" permission so no more InboundSample
         # objects can be added (and the "Add new..." menu item is not displayed)
@@ -103,6 +111,127 @@ class InboundShipmentConsumer(object):
 
         return True
 
+    def process_open(self):
+        """Opens the chunked transfer of an inbound shipment. Creates the
+        inbound shipment without samples, that are received later in pages.
+        Resumes the transfer if it was opened already
+        """
+        required_fields = ["lab_code", "shipment_id", "dispatched", "pages"]
+        self.validate(self.data, required=required_fields)
+
+        lab_code = self.data.get("lab_code")
+        lab = self.get_external_laboratory(lab_code)
+
+        shipment_id = self.data.get("shipment_id")
+        shipment = self.get_inbound_shipment(shipment_id, lab,
+                                             full_object=True)
+        if shipment:
+            if is_transfer_in_progress(shipment):
+                # Resume the transfer
+                return True
+            raise ValueError("Inbound shipment already exists: {}"
+                             .format(shipment_id))
+
+        pages = api.to_int(self.data.get("pages"), default=0)
+        total = api.to_int(self.data.get("total"), default=0)
+        shipment = self.create_inbound_shipment(lab)
+        start_transfer(shipment, pages, total)
+        return True
+
+    def process_page(self):
+        """Creates the inbound samples from a page of a chunked transfer of
+        an inbound shipment. Pages received already are skipped
+        """
+        required_fields = ["lab_code", "shipment_id", "samples"]
+        self.validate(self.data, required=required_fields)
+
+        seq = api.to_int(self.data.get("seq"), default=-1)
+        if seq < 0:
+            raise ValueError("Field is missing or empty: seq")
+
+        shipment = self.get_transfer_shipment()
+        if not is_transfer_in_progress(shipment):
+            raise ValueError("No transfer in progress for {}".format(
+                self.data.get("shipment_id")))
+
+        if is_page_received(shipment, seq):
+            return True
+
+        self.create_inbound_samples(shipment, self.get_sample_records())
+
+        set_page_received(shipment, seq)
+        return True
+
+    def process_commit(self):
+        """Completes the chunked transfer of an inbound shipment, as long as
+        all the pages were received
+        """
+        required_fields = ["lab_code", "shipment_id"]
+        self.validate(self.data, required=required_fields)
+
+        shipment = self.get_transfer_shipment()
+        if not is_transfer_in_progress(shipment):
+            return True
+
+        missing = get_missing_pages(shipment)
+        if missing:
+            missing = ", ".join(map(str, missing))
+            raise ValueError("Pages not received: {}".format(missing))
+
+        commit_transfer(shipment)
+
+        # Disallow the "Add portal content" permission so no more InboundSample
+        # objects can be added (and the "Add new..." menu item is not displayed)
+        revoke_permission_for(shipment, AddPortalContent, [])
+        return True
+
+    def get_transfer_shipment(self):
+        """Returns the inbound shipment the current chunked transfer step is
+        about. Raises a ValueError if not found
+        """
+        lab_code = self.data.get("lab_code")
+        lab = self.get_external_laboratory(lab_code)
+        shipment_id = self.data.get("shipment_id")
+        shipment = self.get_inbound_shipment(shipment_id, lab,
+                                             full_object=True)
+        if not shipment:
+            raise ValueError("Inbound shipment not found: {}"
+                             .format(shipment_id))
+        return shipment
+
+    def get_sample_records(self):
+        """Returns the sample records from the data passed-in, validated
+        """
+        required_fields = ["id", "date_sampled", "sample_type"]
+        sample_records = self.data.get("samples")
+        if isinstance(sample_records, six.string_types):
+            if not is_json_deserializable(sample_records):
+                raise ValueError("Value for 'samples' is not a valid JSON")
+            sample_records = json.loads(sample_records)
+        self.validate(sample_records, required=required_fields)
+        return sample_records
+
+    def create_inbound_shipment(self, laboratory, samples=None):
+        """Creates the inbound shipment inside the laboratory passed-in, with
+        the information provided
+        """
+        dispatched = self.data.get("dispatched")
+        dispatched_date = api.to_date(dispatched)
+        if not dispatched_date:
+            raise ValueError("Non-valid datetime format: {}".format(dispatched))
+
+        shipment_id = self.data.get("shipment_id")
+        comments = self.data.get("comments", "")
+        values = {
+            "shipment_id": str(shipment_id),
+            "referring_laboratory": api.get_uid(laboratory),
+            "referring_client": laboratory.getReferringClient(),
+            "comments": str(comments),
+            "dispatched_datetime": DT2dt(dispatched_date),
+            "samples": samples or [],
+        }
+        return api.create(laboratory, "InboundSampleShipment", **values)
+
     def get_inbound_shipment(self, shipment_id, laboratory, full_object=False):
         """Returns the InboundSampleShipment for the shipment id and laboratory
         passed-in, if any. Returns None otherwise
@@ -172,6 +301,29 @@ class InboundShipmentConsumer(object):
 
         return lab
 
+    def create_inbound_samples(self, shipment, records):
+        """Creates the inbound samples inside the shipment with the information
+        provided. Samples are cataloged in a single pass once all of them are
+        created, with the index values they share computed only once
+        """
+        with deferred_indexing():
+            samples = [self.create_inbound_sample(shipment, record)
+                       for record in records]
+
+        shipment_uid = api.get_uid(shipment)
+        values = get_shipment_values(shipment)
+        set_shared_index_values(shipment_uid, values)
+        try:
+            for sample in samples:
+                sample.reindexObject()
+        finally:
+            # The values are no longer valid if the shipment changes later
+            del_shared_index_values(shipment_uid)
+
+        # Update the number of samples of the shipment
+        shipment.reindexObject(idxs=["num_samples"])
+        return samples
+
     def create_inbound_sample(self, shipment, record):
         """Creates an inbound sample inside the shipment with the information
         provided
@@ -186,8 +338,10 @@ class InboundShipmentConsumer(object):
         }
         inbound_sample = api.create(shipment, "InboundSample", **values)
 
-        # Store original data in annotations
+        # Store original data in annotations, in compact form
+        original = dict(filter(lambda item: item[1], record.items()))
+        original = json.dumps(original, separators=(",", ":"))
         annotation = IAnnotations(inbound_sample)
-        annotation["__original__"] = json.dumps(record)
+        annotation["__original__"] = original
 
         return inbound_sample
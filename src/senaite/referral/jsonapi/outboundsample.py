@@ -24,6 +24,8 @@ from datetime import datetime
 
 from senaite.jsonapi.exceptions import APIError
 from senaite.jsonapi.interfaces import IPushConsumer
+from senaite.referral.idempotency import idempotent
+from senaite.referral.inbox import accept_async
 from zope.interface import alsoProvides
 from zope.interface import implementer
 
@@ -31,7 +33,9 @@ from bika.lims import api
 from bika.lims.catalog import CATALOG_ANALYSIS_REQUEST_LISTING
 from bika.lims.interfaces import ISubmitted
 from bika.lims.utils import changeWorkflowState
+from bika.lims.workflow import ActionHandlerPool
 from bika.lims.workflow import doActionFor
+from bika.lims.workflow import push_reindex_to_actions_pool
 
 
 @implementer(IPushConsumer)
@@ -44,6 +48,8 @@ class OutboundSampleConsumer(object):
     def __init__(self, data):
         self.data = data
 
+    @accept_async
+    @idempotent
     def process(self):
         """Processes the data sent via POST. Look for sample and updates their
         analyses in accordance with the received data
@@ -68,8 +74,8 @@ class OutboundSampleConsumer(object):
         if api.get_review_status(sample) != "shipped":
             # We don't rise an exception here because maybe the sample was
             # updated earlier, but the reference lab got a timeout error and
-            # the remote user is now retrying the notification
-            # TODO Keep track of the incoming notifications in current object
+            # the remote user is now retrying the notification. Retries that
+            # carry an idempotency key are answered before reaching this point
             return True
 
         # TODO Performance - convert to queue task
@@ -78,15 +84,23 @@ class OutboundSampleConsumer(object):
         analyses = sample.getAnalyses(full_objects=True, review_state=allowed)
         analyses = dict([(an.getKeyword(), an) for an in analyses])
 
-        # Update the analyses passed-in
-        analysis_records = sample_record.get("analyses")
-        for analysis_record in analysis_records:
-            keyword = analysis_record.get("keyword")
-            analysis = analyses.get(keyword)
-            try:
-                self.update_analysis(analysis, analysis_record)
-            except Exception as e:
-                raise APIError(500, "{}: {}".format(type(e).__name__, str(e)))
+        # Postpone the reindex of the transitioned objects until all analyses
+        # are updated, so the sample and each analysis are reindexed only once
+        pool = ActionHandlerPool.get_instance()
+        pool.queue_pool()
+        try:
+            # Update the analyses passed-in
+            analysis_records = sample_record.get("analyses")
+            for analysis_record in analysis_records:
+                keyword = analysis_record.get("keyword")
+                analysis = analyses.get(keyword)
+                try:
+                    self.update_analysis(analysis, analysis_record)
+                except Exception as e:
+                    msg = "{}: {}".format(type(e).__name__, str(e))
+                    raise APIError(500, msg)
+        finally:
+            pool.resume()
 
         return True
 
@@ -193,24 +207,26 @@ class OutboundSampleConsumer(object):
         verifiers = record.get("verifiers")
         analysis.setReferenceVerifiers(verifiers)
 
-        # Do a manual transition to overcome core's default guards. For
-        # instance system won't allow the submission of an analysis if the
-        # setting "Allow to submit analysis if not assigned" from setup is set
-        # to False. Obviously, this analysis is not assigned to a Worksheet,
-        # cause is processed externally.
+        # Do a manual transition if core's default guards do not allow the
+        # submission. For instance system won't allow the submission of an
+        # analysis if the setting "Allow to submit analysis if not assigned"
+        # from setup is set to False. Obviously, this analysis is not assigned
+        # to a Worksheet, cause is processed externally.
         # TODO 2.x Do not do manual transition, fix getAllowToSubmitNotAssigned
-        alsoProvides(analysis, ISubmitted)
-        wf_id = "bika_analysis_workflow"
-        wf_state = {"action": "submit"}
-        changeWorkflowState(analysis, wf_id, "to_be_verified", **wf_state)
+        succeed, message = doActionFor(analysis, "submit")
+        if not succeed:
+            alsoProvides(analysis, ISubmitted)
+            wf_id = "bika_analysis_workflow"
+            wf_state = {"action": "submit"}
+            changeWorkflowState(analysis, wf_id, "to_be_verified", **wf_state)
 
         # Auto-verify the analysis
         analysis.setSelfVerification(1)
         analysis.setNumberOfRequiredVerifications(1)
         doActionFor(analysis, "verify")
 
-        # Reindex the analysis
-        analysis.reindexObject()
+        # Reindex the analysis when the pool is resumed
+        push_reindex_to_actions_pool(analysis)
 
     def is_invalidated(self, sample):
         """Returns whether the sample was invalidated in present laboratory
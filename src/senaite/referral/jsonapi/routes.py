@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.jsonapi import api
+from senaite.jsonapi.v1 import add_route
+from senaite.referral.inbox import get_receipt
+from senaite.referral.inbox import get_receipt_info
+
+
+@add_route("/referral/receipt/<string:receipt_id>",
+           "senaite.referral.receipt", methods=["GET"])
+def receipt(context, request, receipt_id=None):
+    """Returns the status of a push accepted for async processing
+    """
+    # Cannot check receipts being an anonymous user!
+    if api.is_anonymous():
+        api.fail(401, "Anonymous user")
+
+    obj = get_receipt(receipt_id)
+    if not obj:
+        api.fail(404, "Receipt not found: {}".format(receipt_id))
+
+    # Only the user that sent the push and managers can check the receipt
+    user = api.get_current_user()
+    if user.getId() != obj["user_id"] and not user.has_role("Manager"):
+        api.fail(403, "Not allowed to check the receipt: {}".format(
+            receipt_id))
+
+    info = get_receipt_info(obj)
+    info["url"] = api.url_for("senaite.referral.receipt",
+                              receipt_id=receipt_id)
+    return info
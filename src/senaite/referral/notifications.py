@@ -20,44 +20,350 @@
 
 import json
 from datetime import datetime
-from persistent.list import PersistentList
+from uuid import uuid4
+
+from BTrees.OOBTree import intersection
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from persistent import Persistent
 from requests import Response
 from senaite.referral.utils import is_true
+from ZODB.POSException import ConflictError
 from zope.annotation.interfaces import IAnnotations
 
+from bika.lims import api
+
 POSTS_STORAGE = "senaite.referral.http_posts"
 
+NOTIFICATIONS_INDEX = "senaite.referral.notifications_index"
+
+# Max number of notifications kept in the history of each object
+POSTS_HISTORY_SIZE = 20
+
+# Keys from the post information that are kept in the summary of the last post
+SUMMARY_KEYS = [
+    "url",
+    "status",
+    "reason",
+    "message",
+    "success",
+    "datetime",
+]
+
+
+class NotificationLog(Persistent):
+    """Size-capped log of the notifications (POST requests) sent to a target
+    laboratory for a given object. Keeps a small summary of the last post, so
+    there is no need to load nor decode the history to know about the last
+    notification. The history is stored in a separate persistent record, with
+    each post as a JSON string that is only decoded on demand. Concurrent
+    appends to the log are resolved instead of raising a ConflictError
+    """
+
+    def __init__(self, size=POSTS_HISTORY_SIZE):
+        self.size = size
+        self.last = None
+        self.count = 0
+        # tuple of (datetime, unique id) -> post as a JSON string
+        self.history = OOBTree()
+
+    def append(self, post):
+        """Adds the post to the log
+        :param post: dict with the post information, payload included
+        """
+        self.last = get_post_summary(post)
+        self.count += 1
+
+        history = self.history
+        history[get_history_key(post)] = json.dumps(post)
+
+        # The history is allowed to grow up to twice its size before the
+        # oldest posts are removed, so concurrent appends to the log rarely
+        # remove the same posts and can be resolved
+        if len(history) > 2 * self.size:
+            for key in list(history.keys())[:-self.size]:
+                del history[key]
+
+    def get_entries(self):
+        """Returns the posts kept in the history as JSON strings, sorted from
+        oldest to newest
+        """
+        entries = list(self.history.values())
+        return entries[-self.size:]
+
+    def get_last(self, full=False):
+        """Returns a dict with the summary of the last post or None. If full,
+        returns the whole post information, payload included
+        """
+        if not self.last:
+            return None
+        if full:
+            return json.loads(self.get_entries()[-1])
+        return dict(self.last)
+
+    def get_history(self):
+        """Returns the posts kept in the history, sorted from oldest to newest
+        """
+        return map(json.loads, self.get_entries())
+
+    def __len__(self):
+        return len(self.get_entries())
+
+    def _p_resolveConflict(self, old, committed, new):
+        """Resolves the conflict of concurrent appends to the log. The history
+        resolves its own conflicts, so only the number of posts and the
+        summary of the last post need to be merged
+        """
+        for key in ["size", "history"]:
+            if committed.get(key) != old.get(key):
+                raise ConflictError
+            if new.get(key) != old.get(key):
+                raise ConflictError
+
+        resolved = dict(committed)
+        resolved["count"] = committed["count"] + new["count"] - old["count"]
+
+        # Keep the most recent post as the last one
+        posts = filter(None, [committed.get("last"), new.get("last")])
+        posts = sorted(posts, key=lambda post: post.get("datetime") or "")
+        resolved["last"] = posts and posts[-1] or None
+        return resolved
 
-def get_posts_storage(obj):
-    """Returns the storage with the list of notifications (POST requests) sent
-    to a target laboratory for the given object
+
+def get_history_key(post):
+    """Returns the key of the post passed-in within the history of a log,
+    so posts are sorted from oldest to newest
+    """
+    posted = post.get("datetime") or datetime.now().isoformat()
+    return posted, uuid4().hex
+
+
+class NotificationIndex(Persistent):
+    """Portal-wide index with the status of the last notification (POST
+    request) sent for each object, so objects with failed notifications can
+    be looked up without waking them up
+    """
+
+    def __init__(self):
+        # object uid -> dict with the status of last notification
+        self.records = OOBTree()
+        # uids of objects for which the last notification failed
+        self.failed = OOTreeSet()
+        # laboratory uid -> uids of objects notified to the laboratory
+        self.laboratories = OOBTree()
+
+    def index(self, uid, record):
+        """Indexes the status record of the last notification sent for the
+        object with the given uid
+        """
+        old_record = self.records.get(uid)
+        old_lab = old_record and old_record.get("laboratory")
+        laboratory = record.get("laboratory")
+        if old_lab and old_lab != laboratory:
+            self.remove_from_laboratory(old_lab, uid)
+
+        if laboratory:
+            if laboratory not in self.laboratories:
+                self.laboratories[laboratory] = OOTreeSet()
+            self.laboratories[laboratory].insert(uid)
+
+        if is_true(record.get("success")):
+            if uid in self.failed:
+                self.failed.remove(uid)
+        else:
+            self.failed.insert(uid)
+
+        self.records[uid] = record
+
+    def unindex(self, uid):
+        """Removes the object with the given uid from the index
+        """
+        record = self.records.get(uid)
+        if not record:
+            return
+        laboratory = record.get("laboratory")
+        if laboratory:
+            self.remove_from_laboratory(laboratory, uid)
+        if uid in self.failed:
+            self.failed.remove(uid)
+        del self.records[uid]
+
+    def remove_from_laboratory(self, laboratory, uid):
+        """Removes the object with the given uid from the objects notified to
+        the laboratory, if indexed
+        """
+        uids = self.laboratories.get(laboratory)
+        if uids is not None and uid in uids:
+            uids.remove(uid)
+
+    def get_record(self, uid):
+        """Returns the status record of the last notification sent for the
+        object with the given uid, if any
+        """
+        record = self.records.get(uid)
+        return record and dict(record) or None
+
+    def get_failed(self, laboratory=None):
+        """Returns the uids of the objects for which the last notification
+        failed, optionally filtered by laboratory uid
+        """
+        if not laboratory:
+            return list(self.failed)
+        uids = self.laboratories.get(laboratory)
+        if not uids:
+            return []
+        return list(intersection(self.failed, uids))
+
+    def __len__(self):
+        return len(self.records)
+
+
+def get_notifications_index(portal=None):
+    """Returns the portal-wide index of notification statuses
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(NOTIFICATIONS_INDEX) is None:
+        annotation[NOTIFICATIONS_INDEX] = NotificationIndex()
+    return annotation[NOTIFICATIONS_INDEX]
+
+
+def unindex_notifications(obj):
+    """Removes the status of the last notification sent for the given object
+    from the portal-wide index of notification statuses, if any
+    """
+    annotation = IAnnotations(api.get_portal())
+    index = annotation.get(NOTIFICATIONS_INDEX)
+    if index is not None:
+        index.unindex(api.get_uid(obj))
+
+
+def get_notification_records(uids):
+    """Returns the status records of the last notifications sent for the
+    objects with the given uids. Objects never notified are omitted
+    """
+    index = get_notifications_index()
+    records = [index.get_record(uid) for uid in uids]
+    return filter(None, records)
+
+
+def get_failed_notifications(laboratory=None):
+    """Returns the status records of the last notifications that failed,
+    optionally filtered by laboratory uid
+    """
+    index = get_notifications_index()
+    laboratory = laboratory and api.get_uid(laboratory) or None
+    uids = index.get_failed(laboratory=laboratory)
+    return get_notification_records(uids)
+
+
+def is_failed_notification(obj_or_uid):
+    """Returns whether the last notification sent for the object failed
+    """
+    uid = api.get_uid(obj_or_uid)
+    record = get_notifications_index().get_record(uid)
+    if not record:
+        return False
+    return not is_true(record.get("success"))
+
+
+def index_post(obj, summary):
+    """Indexes the status of the post passed-in as the last one sent for the
+    given object
+    """
+    uid = api.get_uid(obj)
+    record = {
+        "uid": uid,
+        "laboratory": summary.get("remote_lab"),
+        "consumer": summary.get("consumer"),
+        "success": is_true(summary.get("success")),
+        "status": summary.get("status"),
+        "datetime": summary.get("datetime"),
+    }
+    index = get_notifications_index()
+    index.index(uid, record)
+
+
+def get_post_summary(post):
+    """Returns a dict with the summary of the post information passed-in
+    """
+    summary = dict([(key, post.get(key)) for key in SUMMARY_KEYS])
+    payload = post.get("payload") or {}
+    summary.update({
+        "remote_lab": payload.get("remote_lab"),
+        "consumer": payload.get("consumer"),
+    })
+    return summary
+
+
+def get_posts_storage(obj, create=False):
+    """Returns the storage with the notifications (POST requests) sent to a
+    target laboratory for the given object
     :param obj: Content object
-    :returns: PersistentList
+    :param create: whether the storage has to be created if does not exist
+    :returns: NotificationLog, PersistentList of JSON strings if the posts
+        were stored before notification logs were introduced and have not
+        been migrated yet, or None
     """
     annotation = IAnnotations(obj)
-    if annotation.get(POSTS_STORAGE) is None:
-        annotation[POSTS_STORAGE] = PersistentList()
-    return annotation[POSTS_STORAGE]
+    storage = annotation.get(POSTS_STORAGE)
+    if not create or isinstance(storage, NotificationLog):
+        return storage
+
+    # Create the storage, converting the legacy format if necessary
+    log = NotificationLog()
+    for post in storage or []:
+        log.append(json.loads(post))
+    annotation[POSTS_STORAGE] = log
+    return log
 
 
 def get_posts(obj):
-    """Returns all the posts sent to a target laboratory for the given object,
-    sorted from oldest to newest
+    """Returns the posts kept in the history for the given object, sorted
+    from oldest to newest
     :param obj: object the POST is about
     :returns: list of dicts
     """
-    posts = get_posts_storage(obj)
-    return map(json.loads, posts)
+    storage = get_posts_storage(obj)
+    if isinstance(storage, NotificationLog):
+        return storage.get_history()
+    return map(json.loads, storage or [])
 
 
-def get_last_post(obj):
-    """Returns the last post sent to a remote laboratory about the given object
-    or None otherwise
+def get_last_post(obj, full=False):
+    """Returns the summary of the last post sent to a remote laboratory about
+    the given object or None otherwise. If full, returns the whole post
+    information, payload included
     """
-    posts = get_posts(obj)
-    if posts:
-        return posts[-1]
-    return None
+    storage = get_posts_storage(obj)
+    if isinstance(storage, NotificationLog):
+        return storage.get_last(full=full)
+    if not storage:
+        return None
+
+    # Legacy format
+    post = json.loads(storage[-1])
+    if full:
+        return post
+    return get_post_summary(post)
+
+
+def get_last_payload(obj):
+    """Returns the payload of the last post sent to a remote laboratory about
+    the given object or None otherwise
+    """
+    post = get_last_post(obj, full=True)
+    return post and post.get("payload") or None
+
+
+def is_success(response):
+    """Returns whether the response passed-in, either a requests' Response or
+    a dict-like object with the post information, succeeded
+    """
+    if isinstance(response, Response):
+        response = get_post_info(response)
+    return is_true(response.get("success"))
 
 
 def is_error(post):
@@ -141,9 +447,9 @@ def save_post(obj, payload, data_or_response):
         "payload": payload,
     })
 
-    # json-ify
-    data = json.dumps(data)
-
     # Get the storage and append this post
-    storage = get_posts_storage(obj)
+    storage = get_posts_storage(obj, create=True)
     storage.append(data)
+
+    # Keep the portal-wide index of notification statuses up-to-date
+    index_post(obj, storage.get_last())
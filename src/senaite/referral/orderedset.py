@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+
+
+class OrderedUIDSet(Persistent):
+    """Set of UIDs that keeps the order in which they were added. Members are
+    stored in BTrees, so adding, removing and checking for membership does not
+    require to load nor rewrite the whole set, and concurrent additions of
+    distinct members can be resolved
+    """
+
+    def __init__(self, uids=None):
+        # uid -> (sequence number, uid)
+        self.members = OOBTree()
+        # (sequence number, uid) -> uid
+        self.order = OOBTree()
+        # sequence number of the last uid added
+        self.sequence = Length()
+        for uid in uids or []:
+            self.add(uid)
+
+    def next_sequence(self):
+        """Returns the sequence number for the next uid to be added
+        """
+        self.sequence.change(1)
+        return self.sequence()
+
+    def add(self, uid):
+        """Adds the uid to the set. Returns whether the uid was added
+        """
+        if not uid or uid in self.members:
+            return False
+        key = (self.next_sequence(), uid)
+        self.members[uid] = key
+        self.order[key] = uid
+        return True
+
+    def remove(self, uid):
+        """Removes the uid from the set. Returns whether the uid was removed
+        """
+        key = self.members.get(uid)
+        if key is None:
+            return False
+        del self.members[uid]
+        del self.order[key]
+        return True
+
+    def __contains__(self, uid):
+        return uid in self.members
+
+    def __iter__(self):
+        return iter(self.order.values())
+
+    def __len__(self):
+        return len(self.members)
@@ -0,0 +1,688 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import json
+import random
+import threading
+import time
+from datetime import datetime
+from uuid import uuid4
+
+import transaction
+from BTrees.OOBTree import OOBTree
+from BTrees.OOBTree import OOTreeSet
+from persistent.mapping import PersistentMapping
+from requests import Response
+from senaite.referral import logger
+from senaite.referral.circuitbreaker import get_breaker
+from senaite.referral.circuitbreaker import is_unreachable
+from senaite.referral.config import UNSUPPORTED_ACTION
+from senaite.referral.idempotency import IDEMPOTENCY_KEY
+from senaite.referral.inbox import DONE
+from senaite.referral.inbox import FAILED
+from senaite.referral.notifications import get_post_base_info
+from senaite.referral.notifications import get_post_info
+from senaite.referral.notifications import save_post
+from senaite.referral.transfer import CHUNKED
+from senaite.referral.worker import commit
+from senaite.referral.worker import schedule_in_site
+from senaite.referral.worker import submit_in_site
+from zope.annotation.interfaces import IAnnotations
+
+from bika.lims import api
+
+OUTBOX_STORAGE = "senaite.referral.outbox"
+
+# Storage of the UIDs of the laboratories that do not support combined
+# notifications
+UNCOMBINABLE_STORAGE = "senaite.referral.outbox_uncombinable"
+
+# Attribute of the transaction where the ids of the intents to be dispatched
+# once the transaction is committed are stored
+TXN_INTENTS_KEY = "_senaite_referral_outbox_intents"
+
+# Notification intent statuses
+PENDING = "pending"
+DEFERRED = "deferred"
+RETRY = "retry"
+ACCEPTED = "accepted"
+SENDING = "sending"
+
+# Max number of attempts before a failed notification is discarded
+MAX_ATTEMPTS = 10
+
+# Seconds to wait before the first retry of a failed notification. The delay
+# is doubled on each attempt, up to RETRY_MAX_DELAY seconds
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 6 * 60 * 60
+
+# Seconds between consecutive scans of the outbox for due intents
+SCAN_INTERVAL = 30
+
+# Seconds after which a pending intent is considered lost (e.g. the instance
+# was restarted before the intent was sent) and dispatched again
+PENDING_TIMEOUT = 300
+
+# Seconds an instance keeps the claim on an intent it is sending. The intent
+# is considered lost (e.g. the instance was restarted while sending) and
+# dispatched again once elapsed
+LEASE_TIMEOUT = 10 * 60
+
+# Seconds between consecutive checks of the status of a notification the
+# remote laboratory accepted for async processing
+POLL_INTERVAL = 30
+
+# Seconds after which a notification the remote laboratory accepted but did
+# not process yet is sent again. The remote laboratory recognizes the resent
+# notification by its idempotency key
+ACCEPTED_TIMEOUT = 60 * 60
+
+# Max number of concurrent notifications sent to the same laboratory
+MAX_CONCURRENT_PER_LAB = 2
+
+# Actions of combined notifications not supported by earlier versions
+COMBINED_ACTIONS = ["update_analyses"]
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+_dispatchers = set()
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def get_outbox_storage(portal=None):
+    """Returns the storage of notification intents (POST requests) that are
+    awaiting to be sent to a remote laboratory
+    :returns: OOBTree of intent id -> PersistentMapping
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(OUTBOX_STORAGE) is None:
+        annotation[OUTBOX_STORAGE] = OOBTree()
+    return annotation[OUTBOX_STORAGE]
+
+
+def get_uncombinable_storage(portal=None):
+    """Returns the UIDs of the laboratories that rejected a combined
+    notification with actions that are not supported by the version they run
+    :returns: OOTreeSet of laboratory UIDs
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(UNCOMBINABLE_STORAGE) is None:
+        annotation[UNCOMBINABLE_STORAGE] = OOTreeSet()
+    return annotation[UNCOMBINABLE_STORAGE]
+
+
+def get_intent(intent_id, portal=None):
+    """Returns the notification intent with the given id or None
+    """
+    storage = get_outbox_storage(portal=portal)
+    return storage.get(intent_id)
+
+
+def get_intents(portal=None):
+    """Returns all the notification intents from the outbox, sorted from
+    oldest to newest
+    """
+    storage = get_outbox_storage(portal=portal)
+    intents = list(storage.values())
+    return sorted(intents, key=lambda intent: intent["created"])
+
+
+def get_payload(intent):
+    """Returns the payload of the notification intent passed-in as a dict
+    """
+    return json.loads(intent["payload"])
+
+
+def get_parts(intent):
+    """Returns a list of tuples (uid, payload) with the objects the intent
+    passed-in is about and the payload that belongs to each one of them
+    """
+    parts = intent.get("parts")
+    if not parts:
+        return [(intent["uid"], get_payload(intent))]
+    return [(uid, json.loads(payload)) for uid, payload in parts]
+
+
+def add_intent(obj, laboratory, payload, timeout=5, parts=None, portal=None):
+    """Stores the intent of sending a notification (POST request) about the
+    object passed-in to the remote laboratory. The intent is persisted within
+    the current transaction and dispatched only after a successful commit
+    :param parts: list of tuples (object, payload) when the payload combines
+        the notifications about multiple objects
+    :returns: the id of the intent
+    """
+    # The id of the intent is the idempotency key of the notification, so the
+    # remote laboratory does not process it twice when retried
+    intent_id = uuid4().hex
+    payload = dict(payload)
+    payload[IDEMPOTENCY_KEY] = intent_id
+    intent = PersistentMapping({
+        "id": intent_id,
+        "uid": api.get_uid(obj),
+        "laboratory": api.get_uid(laboratory),
+        "payload": json.dumps(payload),
+        "timeout": timeout,
+        "created": datetime.now().isoformat(),
+        "status": PENDING,
+        "attempts": 0,
+        "next_attempt": None,
+        "modified": time.time(),
+    })
+    if parts:
+        parts = [(api.get_uid(part), json.dumps(data)) for part, data in parts]
+        intent["parts"] = parts
+
+    storage = get_outbox_storage(portal=portal)
+    storage[intent_id] = intent
+
+    # Dispatch once the transaction is committed
+    dispatch_after_commit(intent_id, portal=portal)
+    return intent_id
+
+
+def remove_intent(intent_id, portal=None):
+    """Removes the notification intent with the given id from the outbox
+    """
+    storage = get_outbox_storage(portal=portal)
+    if intent_id in storage:
+        del storage[intent_id]
+
+
+def set_intent_status(intent_id, status, next_attempt=None, attempts=None,
+                      portal=None):
+    """Sets the status of the notification intent with the given id, along
+    with the time (in seconds since the epoch) of the next attempt and the
+    number of attempts made, if set
+    """
+    intent = get_intent(intent_id, portal=portal)
+    if not intent:
+        return
+    intent.update({
+        "status": status,
+        "next_attempt": next_attempt,
+        "modified": time.time(),
+    })
+    if attempts is not None:
+        intent["attempts"] = attempts
+
+
+def get_retry_delay(attempts):
+    """Returns the seconds to wait before the next attempt, with exponential
+    backoff based on the number of attempts made and random jitter
+    """
+    delay = min(RETRY_BASE_DELAY * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.5)
+
+
+def is_due(intent, now=None):
+    """Returns whether the notification intent passed-in is due
+    """
+    now = now or time.time()
+    if intent["status"] == SENDING:
+        return is_lease_expired(intent, now=now)
+    if intent["status"] == PENDING:
+        return True
+    next_attempt = intent.get("next_attempt") or 0
+    return next_attempt <= now
+
+
+def is_lease_expired(intent, now=None):
+    """Returns whether the claim on the notification intent passed-in expired
+    """
+    now = now or time.time()
+    return (intent.get("lease") or 0) <= now
+
+
+def claim_intent(intent_id, lease_id, force=False, portal=None):
+    """Claims the notification intent with the given id for sending, so other
+    instances (e.g. ZEO clients) do not send it as well until the lease
+    expires. The intent is not claimed if not due or claimed already
+    """
+    intent = get_intent(intent_id, portal=portal)
+    if not intent:
+        return
+    if intent["status"] == SENDING and not is_lease_expired(intent):
+        return
+    if not force and not is_due(intent):
+        return
+    now = time.time()
+    intent.update({
+        "status": SENDING,
+        "lease": now + LEASE_TIMEOUT,
+        "lease_id": lease_id,
+        "modified": now,
+    })
+
+
+def get_semaphore(lab_uid):
+    """Returns the semaphore that bounds the number of concurrent
+    notifications sent to the laboratory with the given UID
+    """
+    with _semaphores_lock:
+        semaphore = _semaphores.get(lab_uid)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_PER_LAB)
+            _semaphores[lab_uid] = semaphore
+        return semaphore
+
+
+def dispatch_after_commit(intent_id, portal=None):
+    """Schedules the dispatch of the notification intent passed-in for when
+    the current transaction is successfully committed
+    """
+    txn = transaction.get()
+    intent_ids = getattr(txn, TXN_INTENTS_KEY, None)
+    if intent_ids is None:
+        intent_ids = []
+        setattr(txn, TXN_INTENTS_KEY, intent_ids)
+        if portal is None:
+            portal = api.get_portal()
+        db = portal._p_jar.db()
+        site_path = api.get_path(portal)
+        txn.addAfterCommitHook(after_commit, args=(db, site_path, intent_ids))
+    intent_ids.append(intent_id)
+
+
+def after_commit(status, db, site_path, intent_ids):
+    """Hook called after the transaction the intents were added in finishes.
+    Delegates the dispatch of the intents to the background workers, but only
+    if the transaction was committed
+    """
+    if not status:
+        return
+    submit_in_site(db, site_path, process_intents, list(intent_ids))
+
+    # Be sure the retry of failed and deferred intents is running
+    schedule_in_site(db, site_path, dispatch_due, SCAN_INTERVAL)
+    _dispatchers.add(site_path)
+
+
+def start_dispatcher(portal):
+    """Starts the periodic dispatch of the intents that are due in the portal
+    passed-in, if not started yet in this process. Intents left behind by a
+    restart are retried this way, without waiting for new notifications
+    """
+    site_path = api.get_path(portal)
+    if site_path in _dispatchers:
+        return
+
+    # Nothing to dispatch if no notification was ever added to the outbox
+    if IAnnotations(portal).get(OUTBOX_STORAGE) is None:
+        return
+
+    db = portal._p_jar.db()
+    schedule_in_site(db, site_path, dispatch_due, SCAN_INTERVAL)
+    _dispatchers.add(site_path)
+
+
+def dispatch_due(portal):
+    """Delegates the dispatch of the intents that are due to the background
+    workers, one task per intent. Pending intents are considered due only if
+    they have been waiting for too long
+    """
+    now = time.time()
+    db = portal._p_jar.db()
+    site_path = api.get_path(portal)
+    for intent in get_intents(portal=portal):
+        if intent["id"] in _inflight:
+            continue
+        if intent["status"] == PENDING:
+            modified = intent.get("modified") or 0
+            if now - modified < PENDING_TIMEOUT:
+                continue
+        elif not is_due(intent, now=now):
+            continue
+        submit_in_site(db, site_path, process_intents, [intent["id"]])
+
+
+def process_intents(portal, intent_ids, force=False):
+    """Sends the notifications for the intents passed-in. If force is True,
+    the intents are sent regardless of the time set for the next attempt
+    """
+    for intent_id in intent_ids:
+        process_intent(portal, intent_id, force=force)
+
+
+def process_intent(portal, intent_id, force=False):
+    """Sends the notification (POST request) for the intent passed-in, stores
+    the response in the object the notification is about and removes the
+    intent from the outbox. Failed notifications are kept in the outbox to be
+    retried later with exponential backoff
+    """
+    with _inflight_lock:
+        if intent_id in _inflight:
+            return
+        _inflight.add(intent_id)
+    try:
+        send_intent(portal, intent_id, force=force)
+    finally:
+        with _inflight_lock:
+            _inflight.discard(intent_id)
+
+
+def send_intent(portal, intent_id, force=False):
+    """Sends the notification (POST request) for the intent passed-in
+    """
+    # Prevent circular import
+    from senaite.referral.remotelab import get_remote_connection
+
+    intent = get_intent(intent_id, portal=portal)
+    if not intent:
+        return
+    if not force and not is_due(intent):
+        return
+
+    lab_uid = intent["laboratory"]
+    laboratory = api.get_object_by_uid(lab_uid, default=None)
+    payload = get_payload(intent)
+
+    remote_lab = get_remote_connection(laboratory)
+    if intent["status"] == ACCEPTED:
+        # Notification sent already, check if the remote lab processed it
+        if remote_lab:
+            poll_intent(portal, intent, remote_lab)
+        return
+
+    # Claim the intent before sending, so the notification is not sent by
+    # other instances at the same time
+    lease_id = uuid4().hex
+    if not commit(claim_intent, intent_id, lease_id, force=force,
+                  portal=portal):
+        return
+    intent = get_intent(intent_id, portal=portal)
+    if not intent or intent.get("lease_id") != lease_id:
+        return
+
+    breaker = get_breaker(lab_uid)
+    if remote_lab and not breaker.allow():
+        # The laboratory is not reachable. Keep the intent deferred in the
+        # outbox without even trying, to be sent when the breaker closes
+        next_attempt = time.time() + breaker.get_retry_in()
+        commit(set_intent_status, intent_id, DEFERRED,
+               next_attempt=next_attempt, portal=portal)
+        return
+
+    unreachable = False
+    if remote_lab:
+        try:
+            with get_semaphore(lab_uid):
+                response = send_payload(portal, intent, remote_lab, payload)
+            if isinstance(response, Response):
+                response = get_post_info(response)
+        except Exception as e:
+            # Count the error as a failure, so the breaker does not wait for
+            # the outcome of the probe request forever
+            logger.error("Cannot send intent {}: {}".format(intent_id, e))
+            response = get_post_base_info()
+            response.update({
+                "status": 500,
+                "reason": type(e).__name__,
+                "message": str(e),
+                "success": False,
+            })
+            breaker.failure()
+        else:
+            unreachable = is_unreachable(response)
+            if unreachable:
+                breaker.failure()
+            elif breaker.success():
+                # The laboratory is back, send the deferred intents
+                dispatch_deferred(portal, lab_uid)
+    else:
+        response = get_post_base_info()
+        response.update({
+            "status": 500,
+            "reason": "NoConnection",
+            "message": "Cannot connect to remote laboratory",
+            "success": False,
+        })
+
+    success = response.get("success") is True
+    accepted = success and payload.get("transfer") != CHUNKED
+
+    def persist():
+        # Store the response to each of the objects the intent is about
+        for uid, data in get_parts(intent):
+            obj = api.get_object_by_uid(uid, default=None)
+            if obj is not None:
+                save_post(obj, data, dict(response))
+
+        if accepted:
+            # Wait for the remote lab to process the notification
+            next_attempt = time.time() + POLL_INTERVAL
+            set_intent_status(intent_id, ACCEPTED, next_attempt=next_attempt,
+                              portal=portal)
+            set_intent_value(intent_id, "accepted", time.time(),
+                             portal=portal)
+
+        elif success:
+            remove_intent(intent_id, portal=portal)
+
+        elif unreachable:
+            # Keep the intent, to be sent when the laboratory is back
+            next_attempt = time.time() + max(breaker.get_retry_in(),
+                                             get_retry_delay(1))
+            set_intent_status(intent_id, DEFERRED, next_attempt=next_attempt,
+                              portal=portal)
+
+        elif intent.get("parts") and is_unsupported_action(response):
+            # The remote lab does not support the combined payload. Send the
+            # notifications about each object on their own
+            split_intent(intent, portal=portal)
+
+        else:
+            retry_intent(intent, portal=portal)
+
+    if not commit(persist):
+        logger.error("Cannot store the response for intent {}".format(
+            intent_id))
+
+
+def split_intent(intent, portal=None):
+    """Replaces the notification intent passed-in, that combines the
+    notifications about multiple objects, by one intent per object with its
+    original payload. If the intent contains actions that earlier versions
+    do not support, notifications to the laboratory are no longer combined
+    """
+    lab_uid = intent["laboratory"]
+    payload = get_payload(intent)
+    actions = [item.get("action") for item in payload.get("items") or []]
+    if any([action in COMBINED_ACTIONS for action in actions]):
+        logger.warn("Notifications to {} won't be combined anymore".format(
+            lab_uid))
+        get_uncombinable_storage(portal=portal).insert(lab_uid)
+
+    remove_intent(intent["id"], portal=portal)
+    laboratory = api.get_object_by_uid(lab_uid, default=None)
+    if not laboratory:
+        return
+
+    for uid, data in get_parts(intent):
+        # Skip the objects that no longer exist
+        obj = api.get_object_by_uid(uid, default=None)
+        if obj is None:
+            continue
+        add_intent(obj, laboratory, data, timeout=intent["timeout"],
+                   portal=portal)
+
+
+def is_combinable(lab_uid, portal=None):
+    """Returns whether the notifications to the laboratory with the given uid
+    can be combined into a single payload
+    """
+    return lab_uid not in get_uncombinable_storage(portal=portal)
+
+
+def is_unsupported_action(response):
+    """Returns whether the response passed-in, a dict-like object with the
+    error information, denotes the remote laboratory does not support an
+    action from the notification
+    """
+    message = response.get("message") or ""
+    return UNSUPPORTED_ACTION in message
+
+
+def retry_intent(intent, portal=None):
+    """Schedules the next attempt of the notification intent passed-in with
+    exponential backoff, or removes the intent if the max number of attempts
+    has been reached
+    """
+    intent_id = intent["id"]
+    attempts = intent.get("attempts", 0) + 1
+    if attempts >= MAX_ATTEMPTS:
+        logger.error("Giving up on intent {} after {} attempts".format(
+            intent_id, attempts))
+        remove_intent(intent_id, portal=portal)
+        return
+
+    next_attempt = time.time() + get_retry_delay(attempts)
+    set_intent_status(intent_id, RETRY, next_attempt=next_attempt,
+                      attempts=attempts, portal=portal)
+
+
+def poll_intent(portal, intent, remote_lab):
+    """Checks the status of the notification intent passed-in, that the
+    remote laboratory accepted for async processing. The intent is removed
+    once processed, and retried if the remote laboratory failed to process it
+    or did not process it in time
+    """
+    intent_id = intent["id"]
+    lab_uid = intent["laboratory"]
+    breaker = get_breaker(lab_uid)
+    if not breaker.allow():
+        # The laboratory is not reachable. Check again when the breaker closes
+        next_attempt = time.time() + breaker.get_retry_in()
+        commit(set_intent_status, intent_id, ACCEPTED,
+               next_attempt=next_attempt, portal=portal)
+        return
+
+    receipt = remote_lab.get_receipt(intent_id, timeout=intent["timeout"])
+    failed = receipt.get("success") is False
+    if failed and is_unreachable(receipt):
+        breaker.failure()
+    elif breaker.success():
+        # The laboratory is back, send the deferred intents
+        dispatch_deferred(portal, lab_uid)
+
+    status = None if failed else receipt.get("status")
+    waiting = failed or status not in [DONE, FAILED, None]
+    expired = time.time() - intent["accepted"] > ACCEPTED_TIMEOUT
+
+    def persist():
+        if waiting and expired:
+            # Not processed in time, send the notification again
+            logger.warn("Intent {} not processed in time by {}".format(
+                intent_id, lab_uid))
+            retry_intent(intent, portal=portal)
+
+        elif waiting:
+            # Not processed yet or unknown, check again later
+            next_attempt = time.time() + POLL_INTERVAL
+            set_intent_status(intent_id, ACCEPTED, next_attempt=next_attempt,
+                              portal=portal)
+
+        elif status == FAILED:
+            # Store the failure to each of the objects the intent is about
+            response = get_post_base_info()
+            response.update({
+                "url": receipt.get("url", ""),
+                "status": 500,
+                "reason": "ReceiptFailed",
+                "message": receipt.get("error") or "",
+                "success": False,
+            })
+            for uid, data in get_parts(intent):
+                obj = api.get_object_by_uid(uid, default=None)
+                if obj is not None:
+                    save_post(obj, data, dict(response))
+
+            if intent.get("parts") and is_unsupported_action(response):
+                # The remote lab does not support the combined payload
+                split_intent(intent, portal=portal)
+            else:
+                retry_intent(intent, portal=portal)
+
+        else:
+            remove_intent(intent_id, portal=portal)
+
+    if not commit(persist):
+        logger.error("Cannot store the receipt status for intent {}".format(
+            intent_id))
+
+
+def send_payload(portal, intent, remote_lab, payload):
+    """Sends the payload of the intent passed-in to the remote laboratory.
+    Chunked transfers are resumed from the last page acknowledged
+    """
+    timeout = intent["timeout"]
+    if payload.get("transfer") != CHUNKED:
+        # Ask the remote lab to process the payload asynchronously, with the
+        # intent id as the receipt to check its status later
+        payload = dict(payload)
+        payload.update({
+            "async": True,
+            "receipt_id": intent["id"],
+        })
+        return remote_lab.send(payload, timeout=timeout)
+
+    def ack(seq):
+        set_intent_value(intent["id"], "last_ack", seq, portal=portal)
+        # Keep the claim on the intent while the transfer progresses
+        lease = time.time() + LEASE_TIMEOUT
+        set_intent_value(intent["id"], "lease", lease, portal=portal)
+
+    def on_ack(seq):
+        commit(ack, seq)
+
+    start = intent.get("last_ack", -1) + 1
+    return remote_lab.send_chunked(payload, timeout=timeout, start=start,
+                                   on_ack=on_ack)
+
+
+def set_intent_value(intent_id, key, value, portal=None):
+    """Sets the value for the given key to the notification intent
+    """
+    intent = get_intent(intent_id, portal=portal)
+    if intent:
+        intent[key] = value
+
+
+def dispatch_deferred(portal, lab_uid):
+    """Delegates the dispatch of the deferred intents for the laboratory with
+    the given UID to the background workers
+    """
+    intents = get_intents(portal=portal)
+    intent_ids = [intent["id"] for intent in intents
+                  if intent["laboratory"] == lab_uid
+                  and intent["status"] == DEFERRED]
+    if not intent_ids:
+        return
+
+    logger.info("Dispatching {} deferred intents for {}".format(
+        len(intent_ids), lab_uid))
+    db = portal._p_jar.db()
+    site_path = api.get_path(portal)
+    submit_in_site(db, site_path, process_intents, intent_ids, force=True)
@@ -18,8 +18,13 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+from senaite.queue import api as qapi
+
 from bika.lims import api
 
+# Request key where the uids of the objects in the queue are stored
+QUEUED_UIDS_KEY = "_senaite_referral_queued_uids"
+
 
 def is_under_consumption(obj):
     """Returns whether the object is being processed by a consumer within the
@@ -28,3 +33,36 @@ def is_under_consumption(obj):
     request = api.get_request()
     queue_task_uid = request.get("queue_tuid", "")
     return queue_task_uid != "0" and api.is_uid(queue_task_uid)
+
+
+def get_queued_uids():
+    """Returns the uids of the objects that are either queued or being
+    processed by the queue. The queue is scanned only once per request
+    """
+    request = api.get_request()
+    uids = None
+    if request is not None:
+        uids = request.get(QUEUED_UIDS_KEY, None)
+    if uids is None:
+        uids = frozenset()
+        if qapi.is_queue_enabled():
+            uids = frozenset(qapi.get_queue().get_uids())
+        if request is not None:
+            request.set(QUEUED_UIDS_KEY, uids)
+    return uids
+
+
+def reset_queued_uids():
+    """Flushes the uids of the objects in the queue stored in current request,
+    so the queue is scanned again on next call to get_queued_uids
+    """
+    request = api.get_request()
+    if request is not None:
+        request.set(QUEUED_UIDS_KEY, None)
+
+
+def is_queued(brain_object_uid):
+    """Returns whether the object passed-in is either queued or being
+    processed by the queue
+    """
+    return api.get_uid(brain_object_uid) in get_queued_uids()
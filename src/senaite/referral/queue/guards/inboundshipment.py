@@ -18,10 +18,12 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
-from senaite.queue import api as qapi
+from senaite.referral.catalog import INBOUND_SAMPLE_CATALOG
+from senaite.referral.queue import get_queued_uids
 from senaite.referral.queue import is_under_consumption
 from zope.interface import implementer
 
+from bika.lims import api
 from bika.lims.interfaces import IGuardAdapter
 
 
@@ -39,13 +41,16 @@ class InboundShipmentGuardAdapter(object):
             # Let the consumer perform the transition if necessary
             return True
 
+        queued = get_queued_uids()
+        if not queued:
+            return True
+
         # Check if the shipment is queued
-        if qapi.is_queued(self.context):
+        if api.get_uid(self.context) in queued:
             return False
 
         # Check whether the shipment contains queued samples
-        for sample in self.context.getInboundSamples():
-            if qapi.is_queued(sample):
-                return False
-
-        return True
+        query = {"shipment_uid": api.get_uid(self.context)}
+        brains = api.search(query, INBOUND_SAMPLE_CATALOG)
+        uids = set(map(api.get_uid, brains))
+        return not uids.intersection(queued)
@@ -20,14 +20,12 @@
 
 from senaite.core.listing.interfaces import IListingView
 from senaite.core.listing.interfaces import IListingViewAdapter
-from senaite.queue import api as qapi
 from senaite.queue import messageFactory as _q
 from senaite.referral import check_installed
+from senaite.referral.queue import is_queued
 from zope.component import adapter
 from zope.interface import implementer
 
-from bika.lims import api
-
 
 @adapter(IListingView)
 @implementer(IListingViewAdapter)
@@ -39,13 +37,13 @@ class InboundSamplesListingAdapter(object):
 
     @check_installed(None)
     def before_render(self):
-        if qapi.is_queued(self.context):
+        if is_queued(self.context):
             self.listing.show_select_column = False
 
     @check_installed(None)
     def folder_item(self, obj, item, index):
-        obj = api.get_object(obj)
-        if qapi.is_queued(obj):
+        # The queue is scanned only once per request, not for every item
+        if is_queued(obj):
             item["disabled"] = True
             item["replace"]["state_title"] = _q("Queued")
 
@@ -20,14 +20,12 @@
 
 from senaite.core.listing.interfaces import IListingView
 from senaite.core.listing.interfaces import IListingViewAdapter
-from senaite.queue import api as qapi
 from senaite.queue import messageFactory as _q
 from senaite.referral import check_installed
+from senaite.referral.queue import is_queued
 from zope.component import adapter
 from zope.interface import implementer
 
-from bika.lims import api
-
 
 @adapter(IListingView)
 @implementer(IListingViewAdapter)
@@ -43,8 +41,8 @@ class InboundShipmentsListingAdapter(object):
 
     @check_installed(None)
     def folder_item(self, obj, item, index):
-        obj = api.get_object(obj)
-        if qapi.is_queued(obj):
+        # The queue is scanned only once per request, not for every item
+        if is_queued(obj):
             item["disabled"] = True
             item["replace"]["state_title"] = _q("Queued")
 
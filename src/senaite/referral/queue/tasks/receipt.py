@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.queue.interfaces import IQueuedTaskAdapter
+from senaite.referral.inbox import fail_receipt
+from senaite.referral.inbox import get_error_message
+from senaite.referral.inbox import run_receipt
+from senaite.referral.interfaces import IExternalLaboratory
+from ZODB.POSException import ConflictError
+from zope.component import adapter
+from zope.interface import implementer
+
+
+@adapter(IExternalLaboratory)
+@implementer(IQueuedTaskAdapter)
+class QueuedReceiptTaskAdapter(object):
+    """Adapter in charge of processing a push that was accepted for async
+    processing from the referral inbox
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def process(self, task):
+        """Processes the push of the receipt from the task
+        """
+        receipt_id = task.get("receipt_id")
+        try:
+            run_receipt(receipt_id)
+        except ConflictError:
+            # Let the queue retry the task
+            raise
+        except Exception as e:
+            fail_receipt(receipt_id, get_error_message(e))
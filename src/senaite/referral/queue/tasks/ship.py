@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from senaite.queue.interfaces import IQueuedTaskAdapter
+from senaite.referral.interfaces import IOutboundSampleShipment
+from senaite.referral.workflow import add_ship_samples_task
+from senaite.referral.workflow import ship_samples_chunk
+from zope.component import adapter
+from zope.interface import implementer
+
+from bika.lims import api
+
+
+@adapter(IOutboundSampleShipment)
+@implementer(IQueuedTaskAdapter)
+class QueuedShipSamplesTaskAdapter(object):
+    """Adapter in charge of the shipment of the samples from the task to the
+    outbound shipment, one chunk at a time
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def process(self, task):
+        """Ships the first chunk of samples from the task and adds a new task
+        for the remaining samples
+        """
+        uids = task.get("uids", [])
+        chunk_size = api.to_int(task.get("chunk_size"), default=0)
+
+        # Ship the first chunk of samples
+        remaining = ship_samples_chunk(uids, self.context, chunk_size)
+
+        # Add remaining samples to the queue
+        if remaining:
+            add_ship_samples_task(remaining, self.context, chunk_size)
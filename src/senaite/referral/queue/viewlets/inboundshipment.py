@@ -20,7 +20,7 @@
 
 from plone.app.layout.viewlets import ViewletBase
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
-from senaite.queue import api as qapi
+from senaite.referral.queue import is_queued
 
 
 class InboundShipmentViewlet(ViewletBase):
@@ -39,4 +39,4 @@ class InboundShipmentViewlet(ViewletBase):
     def is_visible(self):
         """Returns whether this viewlet must be visible or not
         """
-        return qapi.is_queued(self.context)
+        return is_queued(self.context)
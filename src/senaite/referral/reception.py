@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from zope.annotation.interfaces import IAnnotations
+
+from bika.lims import api
+
+# Annotation key where the reception counters of a shipment are stored
+RECEPTION_STORAGE = "senaite.referral.reception"
+
+# Statuses of inbound samples that can still be received
+RECEIVABLE_STATUSES = ["due", "received"]
+
+# Names of the counters kept for each inbound shipment
+TOTAL = "total"
+DUE = "due"
+RECEIVED = "received"
+REJECTED = "rejected"
+COUNTERPART = "counterpart"
+PENDING = "pending"
+
+
+class ReceptionCounters(Persistent):
+    """Counters of the inbound samples from an inbound shipment by status and
+    by whether they have a sample counterpart already. Keeps the last known
+    status of each inbound sample, so the counters are only changed when the
+    status of an inbound sample changes. Counters are Length objects, so
+    concurrent changes are resolved instead of raising a ConflictError
+    """
+
+    def __init__(self):
+        # inbound sample uid -> (status, whether has a sample counterpart)
+        self.samples = OOBTree()
+        # counter name -> Length
+        self.counters = OOBTree()
+        for name in [TOTAL, DUE, RECEIVED, REJECTED, COUNTERPART, PENDING]:
+            self.counters[name] = Length()
+
+    def track(self, uid, status, counterpart):
+        """Updates the counters with the status of the inbound sample passed-in
+        """
+        entry = (status, bool(counterpart))
+        prev = self.samples.get(uid)
+        if prev == entry:
+            return
+        if prev:
+            self.change(prev, -1)
+        self.samples[uid] = entry
+        self.change(entry, 1)
+
+    def untrack(self, uid):
+        """Removes the inbound sample passed-in from the counters
+        """
+        prev = self.samples.get(uid)
+        if not prev:
+            return
+        del self.samples[uid]
+        self.change(prev, -1)
+
+    def change(self, entry, delta):
+        """Changes the counters affected by the entry passed-in
+        """
+        status, counterpart = entry
+        names = [TOTAL, status]
+        if counterpart:
+            names.append(COUNTERPART)
+        elif status in RECEIVABLE_STATUSES:
+            names.append(PENDING)
+
+        for name in names:
+            counter = self.counters.get(name)
+            if counter is None:
+                counter = self.counters[name] = Length()
+            counter.change(delta)
+
+    def get(self, name):
+        """Returns the value of the counter with the given name
+        """
+        counter = self.counters.get(name)
+        if counter is None:
+            return 0
+        return counter()
+
+
+def get_reception_storage(shipment, create=False):
+    """Returns the reception counters of the inbound shipment passed-in
+    :param shipment: InboundSampleShipment object
+    :param create: whether the storage has to be created if does not exist
+    :returns: ReceptionCounters or None
+    """
+    annotation = IAnnotations(shipment)
+    storage = annotation.get(RECEPTION_STORAGE)
+    if storage is None and create:
+        storage = ReceptionCounters()
+        annotation[RECEPTION_STORAGE] = storage
+    return storage
+
+
+def track_inbound_sample(inbound_sample, shipment=None):
+    """Updates the reception counters of the shipment with the current status
+    of the inbound sample passed-in
+    """
+    shipment = shipment or api.get_parent(inbound_sample)
+    storage = get_reception_storage(shipment, create=True)
+    uid = api.get_uid(inbound_sample)
+    status = api.get_review_status(inbound_sample)
+    storage.track(uid, status, inbound_sample.getRawSample())
+
+
+def untrack_inbound_sample(inbound_sample, shipment=None):
+    """Removes the inbound sample passed-in from the reception counters of the
+    shipment
+    """
+    shipment = shipment or api.get_parent(inbound_sample)
+    storage = get_reception_storage(shipment)
+    if storage is not None:
+        storage.untrack(api.get_uid(inbound_sample))
+
+
+def rebuild_reception_counters(shipment):
+    """Rebuilds the reception counters of the inbound shipment passed-in from
+    its inbound samples
+    """
+    annotation = IAnnotations(shipment)
+    annotation[RECEPTION_STORAGE] = ReceptionCounters()
+    for inbound_sample in shipment.getInboundSamples():
+        track_inbound_sample(inbound_sample, shipment=shipment)
+
+
+def get_reception_count(shipment, name):
+    """Returns the number of inbound samples from the shipment for the counter
+    with the given name. Inbound samples are walked through if the counters
+    of the shipment were not set up yet
+    """
+    storage = get_reception_storage(shipment)
+    if storage is None:
+        storage = ReceptionCounters()
+        for inbound_sample in shipment.getInboundSamples():
+            uid = api.get_uid(inbound_sample)
+            status = api.get_review_status(inbound_sample)
+            storage.track(uid, status, inbound_sample.getRawSample())
+    return storage.get(name)
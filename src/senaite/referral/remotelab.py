@@ -18,21 +18,34 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+import collections
 import math
 
 from remotesession import RemoteSession
 from requests.auth import HTTPBasicAuth
 from senaite.core.supermodel import SuperModel
 from senaite.referral import logger
+from senaite.referral.aggregator import add_notification
+from senaite.referral.idempotency import IDEMPOTENCY_KEY
 from senaite.referral.interfaces import IExternalLaboratory
+from senaite.referral.interfaces import IReferralObjectInfo
 from senaite.referral.notifications import get_post_base_info
-from senaite.referral.notifications import save_post
+from senaite.referral.notifications import is_success
+from senaite.referral.transfer import CHUNKED
+from senaite.referral.transfer import COMMIT
+from senaite.referral.transfer import get_pages
+from senaite.referral.transfer import OPEN
+from senaite.referral.transfer import PAGE
+from senaite.referral.transfer import PAGE_SIZE
+from senaite.referral.transfer import TRANSFER_KEYS
 from senaite.referral.utils import get_lab_code
 from senaite.referral.utils import get_user_info
 from senaite.referral.utils import is_valid_url
+from zope.component import queryAdapter
 
 from bika.lims import api
-from bika.lims.interfaces import IAnalysisRequest
+from bika.lims.catalog import CATALOG_ANALYSIS_LISTING
+from bika.lims.catalog import CATALOG_ANALYSIS_REQUEST_LISTING
 from bika.lims.interfaces import IInternalUse
 from bika.lims.utils import format_supsub
 from bika.lims.utils.analysis import format_uncertainty
@@ -57,15 +70,26 @@ def get_remote_connection(laboratory):
     return RemoteLab(laboratory)
 
 
-def get_object_info(obj):
+def get_object_info(obj, action=None, full=False):
     """Returns a dict representation of the object passed-in, suitable for
-    being injected into a POST payload
+    being injected into a POST payload. Returns the minimal representation
+    for the given action unless full is True or no specific adapter exists
     """
     if not api.is_object(obj):
         n_obj = api.get_object(obj, default=None)
         if not n_obj:
             raise ValueError("Type not supported: {}".format(repr(obj)))
-        return get_object_info(n_obj)
+        return get_object_info(n_obj, action=action, full=full)
+
+    # Find out if there is a specific adapter converter
+    if not full:
+        adapter = None
+        if action:
+            adapter = queryAdapter(obj, IReferralObjectInfo, name=action)
+        if not adapter:
+            adapter = queryAdapter(obj, IReferralObjectInfo)
+        if adapter:
+            return adapter.to_dict()
 
     # Basic information
     basic_info = {
@@ -74,11 +98,6 @@ def get_object_info(obj):
         "portal_type": api.get_portal_type(obj),
     }
 
-    # Find out if there is a specific adapter converter
-    # adapter = queryAdapter(obj, IReferralObjectInfo)
-    # if adapter:
-    #     return adapter.to_dict()
-
     # Rely on supermodel
     sm = SuperModel(obj)
     info = sm.to_dict()
@@ -86,6 +105,87 @@ def get_object_info(obj):
     return basic_info
 
 
+def get_samples_info(uids):
+    """Returns a list of dicts, each one representing a sample from the uids
+    passed-in, suitable for the creation of an inbound shipment counterpart
+    in a remote laboratory. The information is built from catalogs metadata,
+    with one single query for all samples analyses. Objects are only woken up
+    when the required metadata is missing
+    """
+    if not uids:
+        return []
+
+    # Samples metadata, keeping the original order
+    query = {"portal_type": "AnalysisRequest", "UID": uids}
+    brains = api.search(query, CATALOG_ANALYSIS_REQUEST_LISTING)
+    brains = dict([(api.get_uid(brain), brain) for brain in brains])
+    brains = filter(None, [brains.get(uid) for uid in uids])
+
+    # Keywords of valid analyses, grouped by sample
+    keywords = get_analyses_keywords(map(api.get_uid, brains))
+
+    def get_sample_info(brain):
+        uid = api.get_uid(brain)
+        sample_type = brain.getSampleTypeTitle
+        date_sampled = brain.getDateSampled
+        priority = brain.getPrioritySortkey
+        priority = priority and priority.split(".")[0] or None
+        if not all([sample_type, date_sampled, priority]):
+            # Required metadata is missing, wake-up the object
+            sample = api.get_object(brain)
+            sample_type = api.get_title(sample.getSampleType())
+            date_sampled = sample.getDateSampled()
+            priority = sample.getPriority()
+
+        return {
+            "id": api.get_id(brain),
+            "sample_type": sample_type,
+            "date_sampled": date_sampled.strftime("%Y-%m-%d"),
+            "priority": priority,
+            "analyses": keywords.get(uid, []),
+        }
+
+    return map(get_sample_info, brains)
+
+
+def get_analyses_keywords(sample_uids):
+    """Returns a dict of sample uid -> list of keywords of the analyses from
+    the samples passed-in that are suitable for referral
+    """
+    query = {
+        "portal_type": "Analysis",
+        "getAncestorsUIDs": sample_uids,
+        "review_state": ["registered", "unassigned", "assigned", "referred"],
+    }
+    brains = api.search(query, CATALOG_ANALYSIS_LISTING)
+
+    sample_uids = set(sample_uids)
+    parents = {}
+    keywords = collections.defaultdict(list)
+    for brain in brains:
+        parent_uid = brain.getParentUID
+        if parent_uid not in sample_uids:
+            # Analysis from a partition. Find out the sample it belongs to
+            if parent_uid not in parents:
+                parents[parent_uid] = get_ancestor_uid(parent_uid, sample_uids)
+            parent_uid = parents[parent_uid]
+        if parent_uid:
+            keywords[parent_uid].append(brain.getKeyword)
+    return keywords
+
+
+def get_ancestor_uid(sample_uid, uids):
+    """Returns the uid of the first ancestor of the sample with the given uid
+    that is contained in the list of uids passed-in
+    """
+    sample = api.get_object_by_uid(sample_uid, default=None)
+    while sample:
+        sample = sample.getParentAnalysisRequest()
+        if sample and api.get_uid(sample) in uids:
+            return api.get_uid(sample)
+    return None
+
+
 def skip_post_action_for(obj):
     """Returns whether POST actions must be skipped for the given object to
     prevent circular calls between referring and referer labs
@@ -134,7 +234,7 @@ class RemoteLab(object):
             # PUSH in current request already. To prevent circular POSTs
             if skip_post_action_for(obj):
                 continue
-            item = get_object_info(obj)
+            item = get_object_info(obj, action=action)
             item["action"] = action
             items.append(item)
 
@@ -157,32 +257,17 @@ class RemoteLab(object):
         passed-in in the remote laboratory
         """
 
-        def get_sample_info(sample_brain_uid):
-            sample = api.get_object(sample_brain_uid)
-            if not IAnalysisRequest.providedBy(sample):
-                return None
-
-            sample_type = sample.getSampleType()
-            date_sampled = sample.getDateSampled()
-
-            state = ["registered", "unassigned", "assigned", "referred"]
-            analyses = sample.getAnalyses(full_objects=False, review_state=state)
-            return {
-                "id": api.get_id(sample),
-                "sample_type": api.get_title(sample_type),
-                "date_sampled": date_sampled.strftime("%Y-%m-%d"),
-                "priority": sample.getPriority(),
-                "analyses": map(lambda an: an.getKeyword, analyses)
-            }
-
         dispatched = shipment.getDispatchedDateTime()
-        samples = map(get_sample_info, shipment.getSamples())
+        samples = get_samples_info(shipment.getRawSamples())
         payload = {
             "consumer": "senaite.referral.inbound_shipment",
             "shipment_id": api.get_id(shipment),
             "dispatched": dispatched.strftime("%Y-%m-%d %H:%M:%S"),
-            "samples": filter(None, samples),
+            "samples": samples,
         }
+        if len(samples) > PAGE_SIZE:
+            # Send the samples in pages, each one in its own POST request
+            payload["transfer"] = CHUNKED
         self.notify(shipment, payload, timeout=timeout)
 
     def update_analyses(self, sample, timeout=5):
@@ -322,8 +407,11 @@ class RemoteLab(object):
         self.notify(sample, payload, timeout=timeout)
 
     def notify(self, obj, payload, timeout=5):
-        """Sends a post for the given payload and stores the response to the
-        object passed-in
+        """Stores the intent of sending a post for the given payload. The post
+        is sent by a background worker once the current transaction is
+        committed, and the response is stored to the object passed-in.
+        Notifications for same laboratory within same transaction are sent
+        together in a single post when possible
         """
         # Be sure we have the basics in place in the payload
         data = {"consumer": "senaite.referral.consumer"}
@@ -335,9 +423,104 @@ class RemoteLab(object):
             "lab_code": get_lab_code()
         })
 
-        # Do the POST request and store the response for later use if required
+        # Collect the notification, to be sent after the transaction commits
+        add_notification(obj, self.laboratory, data, timeout=timeout)
+
+    def send_chunked(self, payload, timeout=5, start=0, on_ack=None):
+        """Sends the inbound shipment payload passed-in in multiple steps: a
+        post that opens the transfer, one post for each page of samples and a
+        final post that commits the transfer. Pages before start are not sent,
+        they were acknowledged by the remote laboratory already. Returns the
+        response of the last post sent
+        """
+        samples = payload.get("samples") or []
+        pages = get_pages(samples)
+
+        base = dict([(key, payload.get(key)) for key in TRANSFER_KEYS])
+        header = dict(payload)
+        header.pop("samples")
+        header.update({
+            "transfer": OPEN,
+            "pages": len(pages),
+            "total": len(samples),
+        })
+
+        # Each step is a push on its own, with its own idempotency key
+        key = payload.get(IDEMPOTENCY_KEY)
+
+        def set_step_key(data, *step):
+            if key:
+                data[IDEMPOTENCY_KEY] = ":".join(map(str, (key, ) + step))
+            return data
+
+        set_step_key(header, OPEN)
+        response = self.send(header, timeout=timeout)
+        if not is_success(response):
+            return response
+
+        for seq in range(start, len(pages)):
+            data = dict(base)
+            data.update({
+                "transfer": PAGE,
+                "seq": seq,
+                "samples": pages[seq],
+            })
+            set_step_key(data, PAGE, seq)
+            response = self.send(data, timeout=timeout)
+            if not is_success(response):
+                return response
+            if on_ack:
+                on_ack(seq)
+
+        data = dict(base)
+        data.update({"transfer": COMMIT})
+        set_step_key(data, COMMIT)
+        return self.send(data, timeout=timeout)
+
+    def get_receipt(self, receipt_id, timeout=5):
+        """Returns a dict with the status of the push with the given receipt
+        id, that the remote laboratory accepted for async processing. The
+        status is None if the remote laboratory does not know about the
+        receipt, e.g. because it processed the push right away. Returns a
+        dict-like object with the error information and success set to False
+        if the status cannot be retrieved
+        """
+        endpoint = "referral/receipt/{}".format(receipt_id)
+        error = get_post_base_info()
+        error["url"] = self.session.get_api_url(endpoint)
         try:
-            response = self.session.post("push", data, timeout=timeout)
+            response = self.session.get(endpoint, timeout=timeout)
+        except Exception as e:
+            logger.error(str(e))
+            error.update({
+                "status": 500,
+                "reason": type(e).__name__,
+                "message": str(e),
+            })
+            return error
+
+        if response.status_code == 404:
+            return {"receipt_id": receipt_id, "status": None}
+
+        error.update({
+            "status": response.status_code,
+            "reason": response.reason,
+            "message": response.text,
+        })
+        if not response.ok:
+            return error
+
+        try:
+            return response.json()
+        except ValueError:
+            return error
+
+    def send(self, payload, timeout=5):
+        """Sends a post for the given payload and returns the response or a
+        dict-like object with the error information
+        """
+        try:
+            return self.session.post("push", payload, timeout=timeout)
         except Exception as e:
             # Dummy response
             response = get_post_base_info()
@@ -349,7 +532,4 @@ class RemoteLab(object):
                 "success": False,
             })
             logger.error(str(e))
-
-        # Store the response, so we can keep track of the POSTs made for this
-        # given object and retry if necessary
-        save_post(obj, data, response)
+            return response
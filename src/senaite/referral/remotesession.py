@@ -19,11 +19,68 @@
 # Some rights reserved, see README and LICENSE.
 
 import json
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
 from senaite.referral import logger
 from six import string_types
 
+# Number of per-host connection pools kept by each pooled session
+POOL_CONNECTIONS = 10
+
+# Max number of keep-alive connections kept for each host
+POOL_MAXSIZE = 20
+
+# Process-wide registry of pooled sessions, keyed by (host, credentials)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_auth_key(auth):
+    """Returns a hashable key that represents the auth passed-in
+    """
+    if auth is None:
+        return None
+    username = getattr(auth, "username", None)
+    password = getattr(auth, "password", None)
+    if username is None and password is None:
+        return repr(auth)
+    return username, password
+
+
+def get_pooled_session(host, auth):
+    """Returns the keep-alive requests.Session shared by all threads and
+    RemoteSession instances for the host and auth passed-in
+    """
+    key = (host, get_auth_key(auth))
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            session.auth = auth
+            adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS,
+                                  pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def invalidate_sessions(host=None):
+    """Closes and discards the pooled sessions for the given host, regardless
+    of the credentials. Discards all pooled sessions if no host is set
+    """
+    with _sessions_lock:
+        keys = filter(lambda k: host is None or k[0] == host, _sessions.keys())
+        sessions = [_sessions.pop(key) for key in keys]
+
+    for session in sessions:
+        try:
+            session.close()
+        except Exception as e:
+            logger.warn("Cannot close session: {}".format(str(e)))
+
 
 class RemoteSession(object):
 
@@ -32,6 +89,7 @@ class RemoteSession(object):
     def __init__(self, host, auth):
         self.host = host
         self.auth = auth
+        self.session = get_pooled_session(host, auth)
 
     def get_api_url(self, endpoint):
         """Returns the API url of the remote instance and endpoint
@@ -58,7 +116,18 @@ class RemoteSession(object):
         # Send the POST request
         logger.info("[POST] {}".format(url))
         logger.info("[POST PAYLOAD] {}".format(repr(payload)))
-        resp = requests.post(url, json=payload, auth=self.auth, timeout=timeout)
+        resp = self.session.post(url, json=payload, auth=self.auth,
+                                 timeout=timeout)
+
+        # Return the response
+        return resp
+
+    def get(self, endpoint, timeout=5):
+        url = self.get_api_url(endpoint)
+
+        # Send the GET request
+        logger.info("[GET] {}".format(url))
+        resp = self.session.get(url, auth=self.auth, timeout=timeout)
 
         # Return the response
         return resp
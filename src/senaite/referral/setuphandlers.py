@@ -28,12 +28,25 @@ from senaite.referral.config import PROFILE_ID
 from senaite.referral.config import UNINSTALL_ID
 
 from bika.lims import api
+from bika.lims.catalog import CATALOG_ANALYSIS_REQUEST_LISTING
 
 CATALOGS = (
     InboundSampleCatalog,
     ShipmentCatalog,
 )
 
+# Indexes to add in portal_catalog
+PORTAL_CATALOG_INDEXES = [
+    # id, indexed attribute, type
+    ("laboratory_code", "", "FieldIndex"),
+]
+
+# Columns to add in core catalogs
+CORE_CATALOG_COLUMNS = [
+    # catalog id, column
+    (CATALOG_ANALYSIS_REQUEST_LISTING, "referral_shipments"),
+]
+
 # Tuples of (folder_id, folder_name, type)
 PORTAL_FOLDERS = [
     ("external_labs", "External laboratories", "ExternalLaboratoryFolder"),
@@ -525,6 +538,17 @@ def setup_catalogs(portal):
                 logger.info("*** Mapped catalog '%s' for type '%s'"
                             % (catalog_id, portal_type))
 
+    # portal_catalog indexes
+    catalog = api.get_tool("portal_catalog")
+    for idx_id, idx_attr, idx_type in PORTAL_CATALOG_INDEXES:
+        if add_catalog_index(catalog, idx_id, idx_attr, idx_type):
+            to_reindex.append((catalog, idx_id))
+
+    # core catalogs columns
+    for catalog_id, column in CORE_CATALOG_COLUMNS:
+        catalog = api.get_tool(catalog_id)
+        add_catalog_column(catalog, column)
+
     # reindex new indexes
     for catalog, idx_id in to_reindex:
         reindex_catalog_index(catalog, idx_id)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+from BTrees.OOBTree import OOTreeSet
+from persistent.mapping import PersistentMapping
+from zope.annotation.interfaces import IAnnotations
+
+TRANSFER_STORAGE = "senaite.referral.transfer"
+
+# Transfer of a shipment in multiple steps
+CHUNKED = "chunked"
+
+# Steps of the chunked transfer of a shipment
+OPEN = "open"
+PAGE = "page"
+COMMIT = "commit"
+
+# Max number of samples sent in a single page. Shipments with less samples
+# than this are sent in a single POST request
+PAGE_SIZE = 100
+
+# Keys from the shipment payload that are sent on every step
+TRANSFER_KEYS = ["consumer", "remote_lab", "lab_code", "shipment_id"]
+
+
+def get_transfer(shipment):
+    """Returns the status of the chunked transfer of the inbound shipment
+    passed-in, or None if the shipment was not transferred in chunks
+    """
+    annotation = IAnnotations(shipment)
+    return annotation.get(TRANSFER_STORAGE)
+
+
+def start_transfer(shipment, pages, total):
+    """Starts the chunked transfer of the inbound shipment passed-in, that
+    will be made of the given number of pages and samples
+    """
+    transfer = PersistentMapping({
+        "pages": pages,
+        "total": total,
+        "received": OOTreeSet(),
+        "committed": False,
+    })
+    annotation = IAnnotations(shipment)
+    annotation[TRANSFER_STORAGE] = transfer
+    return transfer
+
+
+def is_page_received(shipment, seq):
+    """Returns whether the page with the given sequence number has been
+    received already for the inbound shipment passed-in
+    """
+    transfer = get_transfer(shipment)
+    return transfer is not None and seq in transfer["received"]
+
+
+def set_page_received(shipment, seq):
+    """Flags the page with the given sequence number as received
+    """
+    transfer = get_transfer(shipment)
+    transfer["received"].insert(seq)
+
+
+def get_missing_pages(shipment):
+    """Returns the sequence numbers of the pages not received yet
+    """
+    transfer = get_transfer(shipment)
+    if not transfer:
+        return []
+    received = transfer["received"]
+    return [seq for seq in range(transfer["pages"]) if seq not in received]
+
+
+def commit_transfer(shipment):
+    """Flags the chunked transfer of the shipment passed-in as completed
+    """
+    transfer = get_transfer(shipment)
+    transfer["committed"] = True
+
+
+def is_transfer_in_progress(shipment):
+    """Returns whether the inbound shipment passed-in is still being
+    transferred in chunks from the referring laboratory
+    """
+    transfer = get_transfer(shipment)
+    if transfer is None:
+        return False
+    return not transfer["committed"]
+
+
+def get_pages(samples, size=PAGE_SIZE):
+    """Splits the list of samples passed-in in pages of the given size
+    """
+    return [samples[num:num+size] for num in range(0, len(samples), size)]
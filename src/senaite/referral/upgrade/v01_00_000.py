@@ -24,10 +24,17 @@ from senaite.referral import logger
 from senaite.referral.catalog import INBOUND_SAMPLE_CATALOG
 from senaite.referral.catalog import SHIPMENT_CATALOG
 from senaite.referral.config import PRODUCT_NAME as product
+from senaite.referral.notifications import get_last_post
+from senaite.referral.notifications import get_posts_storage
+from senaite.referral.notifications import index_post
+from senaite.referral.notifications import NotificationLog
+from senaite.referral.reception import rebuild_reception_counters
 from senaite.referral.setuphandlers import setup_catalogs
 from senaite.referral.setuphandlers import setup_workflows
+from senaite.referral.utils import set_laboratory_code
 
 from bika.lims import api
+from bika.lims.catalog import CATALOG_ANALYSIS_REQUEST_LISTING
 from bika.lims.utils import changeWorkflowState
 from bika.lims.upgrade import upgradestep
 from bika.lims.upgrade.utils import commit_transaction
@@ -215,3 +222,243 @@ def setup_invalidate_at_reference(tool):
     setup_workflows(portal)
 
     logger.info("Setup transition 'invalidate_at_reference' [DONE]")
+
+
+def migrate_notification_logs(tool):
+    logger.info("Migrate notification logs ...")
+    query = {"portal_type": "AnalysisRequest"}
+    brains = api.search(query, CATALOG_ANALYSIS_REQUEST_LISTING)
+    migrate_notification_logs_for(brains)
+
+    query = {"portal_type": ["InboundSampleShipment", "OutboundSampleShipment"]}
+    brains = api.search(query, SHIPMENT_CATALOG)
+    migrate_notification_logs_for(brains)
+    logger.info("Migrate notification logs [DONE]")
+
+
+def migrate_notification_logs_for(brains):
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        # Convert the legacy list of posts, if any
+        storage = get_posts_storage(obj)
+        if storage is not None and not isinstance(storage, NotificationLog):
+            get_posts_storage(obj, create=True)
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+
+def setup_notifications_index(tool):
+    logger.info("Setup notifications index ...")
+    portal = tool.aq_inner.aq_parent
+    setup = portal.portal_setup
+    setup.runImportStepFromProfile(profile, "controlpanel")
+
+    query = {"portal_type": "AnalysisRequest"}
+    brains = api.search(query, CATALOG_ANALYSIS_REQUEST_LISTING)
+    index_notifications_for(brains)
+
+    query = {"portal_type": ["InboundSampleShipment", "OutboundSampleShipment"]}
+    brains = api.search(query, SHIPMENT_CATALOG)
+    index_notifications_for(brains)
+    logger.info("Setup notifications index [DONE]")
+
+
+def index_notifications_for(brains):
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        post = get_last_post(obj)
+        if post:
+            index_post(obj, post)
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+
+def setup_laboratory_code_index(tool):
+    logger.info("Setup laboratory code index ...")
+    portal = tool.aq_inner.aq_parent
+
+    # Setup catalogs
+    setup_catalogs(portal)
+
+    # Build the lookup table of laboratory codes
+    query = {"portal_type": "ExternalLaboratory"}
+    for brain in api.search(query, "portal_catalog"):
+        obj = api.get_object(brain)
+        set_laboratory_code(obj)
+
+    logger.info("Setup laboratory code index [DONE]")
+
+
+def migrate_outbound_shipment_samples(tool):
+    logger.info("Migrate samples of outbound shipments ...")
+    query = {"portal_type": "OutboundSampleShipment"}
+    brains = api.search(query, SHIPMENT_CATALOG)
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        # Convert the legacy list of sample uids, if any
+        obj.get_samples_storage(create=True)
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+    logger.info("Migrate samples of outbound shipments [DONE]")
+
+
+def setup_chunk_size_ship(tool):
+    logger.info("Setup chunk size for samples shipment ...")
+    portal = tool.aq_inner.aq_parent
+    setup = portal.portal_setup
+    setup.runImportStepFromProfile(profile, "plone.app.registry")
+    logger.info("Setup chunk size for samples shipment [DONE]")
+
+
+def setup_reception_counters(tool):
+    logger.info("Setup reception counters of inbound shipments ...")
+    query = {"portal_type": "InboundSampleShipment"}
+    brains = api.search(query, SHIPMENT_CATALOG)
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        # Count the inbound samples of the shipment
+        rebuild_reception_counters(obj)
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+    logger.info("Setup reception counters of inbound shipments [DONE]")
+
+
+def setup_referral_shipments_metadata(tool):
+    logger.info("Setup shipments metadata in samples catalog ...")
+    portal = tool.aq_inner.aq_parent
+
+    # Setup catalogs
+    setup_catalogs(portal)
+
+    # Collect the samples assigned to a shipment
+    uids = []
+    query = {"portal_type": ["InboundSampleShipment", "OutboundSampleShipment"]}
+    for brain in api.search(query, SHIPMENT_CATALOG):
+        shipment = api.get_object(brain)
+        uids.extend(shipment.getRawSamples())
+        shipment._p_deactivate()
+
+    # Update the metadata of the samples
+    catalog = api.get_tool(CATALOG_ANALYSIS_REQUEST_LISTING)
+    query = {"UID": list(set(uids))}
+    brains = api.search(query, CATALOG_ANALYSIS_REQUEST_LISTING)
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        catalog.catalog_object(obj, idxs=["getId"])
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+    logger.info("Setup shipments metadata in samples catalog [DONE]")
+
+
+def setup_inbound_samples_listing_metadata(tool):
+    logger.info("Setup listing metadata for inbound samples ...")
+    portal = tool.aq_inner.aq_parent
+
+    # Setup catalogs
+    setup_catalogs(portal)
+
+    # Re-catalog inbound samples
+    recatalog_inbound_samples(portal)
+
+    logger.info("Setup listing metadata for inbound samples [DONE]")
+
+
+def setup_shipments_listing_metadata(tool):
+    logger.info("Setup listing metadata for shipments ...")
+    portal = tool.aq_inner.aq_parent
+
+    # Setup catalogs. New indexes are reindexed here
+    setup_catalogs(portal)
+
+    # Update the metadata of the shipments
+    catalog = api.get_tool(SHIPMENT_CATALOG)
+    query = {"portal_type": ["InboundSampleShipment", "OutboundSampleShipment"]}
+    brains = api.search(query, SHIPMENT_CATALOG)
+    total = len(brains)
+    for num, brain in enumerate(brains):
+        if num and num % 100 == 0:
+            logger.info("Processed objects: {}/{}".format(num, total))
+
+        if num and num % 1000 == 0:
+            commit_transaction()
+
+        obj = api.get_object(brain, default=None)
+        if not obj:
+            path = brain.getPath()
+            logger.warn("Stale catalog entry: {}".format(path))
+            continue
+
+        catalog.catalog_object(obj, idxs=["getId"])
+
+        # Flush the object from memory
+        obj._p_deactivate()
+
+    logger.info("Setup listing metadata for shipments [DONE]")
@@ -23,12 +23,16 @@ import copy
 import json
 from datetime import datetime
 
+from BTrees.OOBTree import OOBTree
 from plone.api.exc import InvalidParameterError
+from plone.memoize import ram
+from plone.memoize.volatile import DontCache
 from senaite.referral import messageFactory as _
 from senaite.referral import PRODUCT_NAME
 from six import string_types
 from six.moves.urllib import parse
 from slugify import slugify
+from zope.annotation.interfaces import IAnnotations
 
 from bika.lims import api
 from bika.lims.utils import render_html_attributes
@@ -41,6 +45,16 @@ _marker = object()
 
 RESPONSES_ATTR_NAME = "_referal_post_responses"
 
+LABORATORY_CODES_STORAGE = "senaite.referral.laboratory_codes"
+
+# Indexes to use for filters, grouped by portal_type. Filters that are not
+# listed here are resolved with the index of same name, if any
+FILTER_INDEXES = {
+    "ExternalLaboratory": {
+        "code": "laboratory_code",
+    }
+}
+
 
 def set_field_value(instance, field_name, value):
     """Sets the value to a Schema field
@@ -92,6 +106,14 @@ def get_by_code(portal_type, code, catalog="portal_catalog"):
     """
     if not code:
         return None
+
+    if portal_type == "ExternalLaboratory":
+        # resolve the laboratory directly from the lookup table
+        uid = get_laboratory_uid(code)
+        lab = api.get_object_by_uid(uid, default=None)
+        if lab and lab.getCode() == code:
+            return lab
+
     query = {
         "portal_type": portal_type,
         "filters": {
@@ -102,11 +124,23 @@ def get_by_code(portal_type, code, catalog="portal_catalog"):
 
 
 def search_with_filters(query, catalog, first_only=False):
-    """Returns the objects for the code passed-in, if any
+    """Returns the objects for the code passed-in, if any. Filters for which
+    an index exists in the catalog are converted to index queries
     """
     qry = copy.deepcopy(query)
     filters = qry.pop("filters", {})
 
+    # move the filters that can be resolved by an index to the query
+    cat = api.get_tool(catalog)
+    indexes = cat.indexes()
+    portal_type = qry.get("portal_type")
+    portal_type = isinstance(portal_type, string_types) and portal_type
+    filter_indexes = FILTER_INDEXES.get(portal_type) or {}
+    for key, value in filters.items():
+        index = filter_indexes.get(key, key)
+        if index in indexes:
+            qry[index] = value
+
     def is_match(obj):
         for key, value in filters.items():
             obj_value = get_field_value(obj, key)
@@ -129,6 +163,54 @@ def search_with_filters(query, catalog, first_only=False):
     return matches
 
 
+def get_laboratory_codes_storage(portal=None):
+    """Returns the lookup table of external laboratory codes
+    :returns: OOBTree of laboratory code -> laboratory UID
+    """
+    if portal is None:
+        portal = api.get_portal()
+    annotation = IAnnotations(portal)
+    if annotation.get(LABORATORY_CODES_STORAGE) is None:
+        annotation[LABORATORY_CODES_STORAGE] = OOBTree()
+    return annotation[LABORATORY_CODES_STORAGE]
+
+
+def get_laboratory_uid(code):
+    """Returns the UID of the external laboratory with the code passed-in
+    from the lookup table, if any
+    """
+    if not code:
+        return None
+    storage = get_laboratory_codes_storage()
+    return storage.get(code)
+
+
+def set_laboratory_code(laboratory):
+    """Updates the lookup table with the code of the laboratory passed-in
+    """
+    uid = api.get_uid(laboratory)
+    code = laboratory.getCode()
+    storage = get_laboratory_codes_storage()
+    if code and storage.get(code) == uid:
+        # nothing changed
+        return
+
+    # remove the previous code of the laboratory, if any
+    remove_laboratory_code(laboratory)
+    if code:
+        storage[code] = uid
+
+
+def remove_laboratory_code(laboratory):
+    """Removes the laboratory passed-in from the lookup table
+    """
+    uid = api.get_uid(laboratory)
+    storage = get_laboratory_codes_storage()
+    codes = [code for code, lab_uid in storage.items() if lab_uid == uid]
+    for code in codes:
+        del storage[code]
+
+
 def is_valid_url(value):
     """Return true if the value is a well-formed url
     """
@@ -285,11 +367,38 @@ def get_user_info(user_or_username, default=_marker):
     return properties
 
 
+def get_creator_fullname(obj):
+    """Returns the fullname of the user who created the object passed-in
+    """
+    creator = obj.Creator()
+    properties = api.get_user_properties(creator)
+    return properties.get("fullname", creator)
+
+
+def setup_catalog_cache_key(func, *args, **kwargs):
+    """Returns the cache key for functions whose result depends on the objects
+    from the setup catalog only. The key changes whenever an object is added,
+    modified or removed from the setup catalog
+    """
+    catalog = api.get_tool(SETUP_CATALOG)
+    get_counter = getattr(catalog, "getCounter", None)
+    if not callable(get_counter):
+        # Catalog does not keep track of changes
+        raise DontCache
+    portal_path = api.get_path(api.get_portal())
+    return portal_path, func.__name__, get_counter()
+
+
 def get_sample_types_mapping():
     """Returns a dict with sample type titles, ids and prefixes as keys and
     values as sample type UIDs to facilitate the retrieval by id, prefix or
     title
     """
+    return dict(_get_sample_types_mapping())
+
+
+@ram.cache(setup_catalog_cache_key)
+def _get_sample_types_mapping():
     sample_types = dict()
     query = {"portal_type": "SampleType", "is_active": True}
     brains = api.search(query, SETUP_CATALOG)
@@ -311,6 +420,11 @@ def get_services_mapping():
     as service UIDs to facilitate the retrieval of services by title, keyword
     or by id
     """
+    return dict(_get_services_mapping())
+
+
+@ram.cache(setup_catalog_cache_key)
+def _get_services_mapping():
     services = dict()
     query = {"portal_type": "AnalysisService", "is_active": True}
     brains = api.search(query, SETUP_CATALOG)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of SENAITE.REFERRAL.
+#
+# SENAITE.REFERRAL is free software: you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the Free
+# Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright 2021-2022 by it's authors.
+# Some rights reserved, see README and LICENSE.
+
+import threading
+import time
+
+import transaction
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import noSecurityManager
+from AccessControl.User import UnrestrictedUser
+from senaite.referral import logger
+from senaite.referral.interfaces import ISenaiteReferralLayer
+from six.moves import queue
+from Testing.makerequest import makerequest
+from ZODB.POSException import ConflictError
+from zope.component.hooks import setSite
+from zope.globalrequest import setRequest
+from zope.interface import alsoProvides
+
+# Number of background threads that process tasks
+POOL_SIZE = 4
+
+# Number of times a commit is retried on ConflictError
+COMMIT_RETRIES = 3
+
+# Id of the user the background tasks run as
+WORKER_USER_ID = "senaite.referral.worker"
+
+_tasks = queue.Queue()
+_threads = []
+_threads_lock = threading.Lock()
+
+# Periodic tasks, keyed by (site path, task name)
+_scheduled = {}
+_scheduled_lock = threading.Lock()
+
+
+def start():
+    """Starts the pool of background threads, if not started yet
+    """
+    with _threads_lock:
+        alive = filter(lambda thread: thread.is_alive(), _threads)
+        for num in range(len(alive), POOL_SIZE):
+            name = "{}-{}".format(WORKER_USER_ID, num)
+            thread = threading.Thread(target=consume, name=name)
+            thread.setDaemon(True)
+            thread.start()
+            alive.append(thread)
+        _threads[:] = alive
+
+
+def submit(func, *args, **kwargs):
+    """Adds a task to be processed by the pool of background threads
+    """
+    start()
+    _tasks.put((func, args, kwargs))
+
+
+def consume():
+    """Processes the tasks from the queue forever
+    """
+    while True:
+        func, args, kwargs = _tasks.get()
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.exception("Background task failed: {}".format(str(e)))
+        finally:
+            _tasks.task_done()
+
+
+def submit_in_site(db, site_path, func, *args, **kwargs):
+    """Adds a task to be processed by the pool of background threads inside
+    the site with the given path, with func(site, *args, **kwargs) signature
+    """
+    submit(run_in_site, db, site_path, func, *args, **kwargs)
+
+
+def schedule_in_site(db, site_path, func, interval):
+    """Starts a daemon thread that submits func(site) to the pool of
+    background threads every interval seconds, if not started yet
+    """
+    key = (site_path, "{}.{}".format(func.__module__, func.__name__))
+    with _scheduled_lock:
+        thread = _scheduled.get(key)
+        if thread and thread.is_alive():
+            return
+
+        def tick():
+            while True:
+                time.sleep(interval)
+                submit_in_site(db, site_path, func)
+
+        name = "{}-scheduler-{}".format(WORKER_USER_ID, func.__name__)
+        thread = threading.Thread(target=tick, name=name)
+        thread.setDaemon(True)
+        thread.start()
+        _scheduled[key] = thread
+
+
+def run_in_site(db, site_path, func, *args, **kwargs):
+    """Opens a new connection to the database, sets up the site, request and
+    security and calls func(site, *args, **kwargs). The transaction is aborted
+    afterwards, so func is responsible of committing its own changes
+    """
+    connection = db.open()
+    try:
+        app = makerequest(connection.root()["Application"])
+        site = app.unrestrictedTraverse(site_path)
+
+        # Setup the request and site
+        request = app.REQUEST
+        alsoProvides(request, ISenaiteReferralLayer)
+        setRequest(request)
+        setSite(site)
+
+        # Run as an unrestricted user
+        acl_users = site.acl_users
+        user = UnrestrictedUser(WORKER_USER_ID, "", ["Manager"], [])
+        newSecurityManager(None, user.__of__(acl_users))
+
+        return func(site, *args, **kwargs)
+
+    finally:
+        transaction.abort()
+        noSecurityManager()
+        setSite(None)
+        setRequest(None)
+        connection.close()
+
+
+def commit(func, *args, **kwargs):
+    """Calls func(*args, **kwargs) and commits the transaction. Retries both
+    on ConflictError up to COMMIT_RETRIES times. Returns whether the commit
+    succeeded
+    """
+    for attempt in range(COMMIT_RETRIES):
+        try:
+            func(*args, **kwargs)
+            transaction.commit()
+            return True
+        except ConflictError:
+            transaction.abort()
+            logger.warn("ConflictError on attempt {}/{}".format(
+                attempt + 1, COMMIT_RETRIES))
+    return False
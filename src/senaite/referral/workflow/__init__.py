@@ -29,16 +29,22 @@ from zope.lifecycleevent import modified
 from bika.lims import api
 from bika.lims.interfaces import IAnalysisRequest
 from bika.lims.utils import changeWorkflowState
+from bika.lims.workflow import ActionHandlerPool
 from bika.lims.workflow import doActionFor
 from senaite.referral.utils import get_chunk_size_for
 
 try:
     from senaite.queue.api import is_queue_ready
     from senaite.queue.api import add_action_task
+    from senaite.queue.api import add_task
+    from senaite.referral.queue import reset_queued_uids
 except ImportError:
     # Queue is not installed
     is_queue_ready = None
 
+# Name of the queue task for the shipment of samples
+SHIP_SAMPLES_TASK = "task_referral_ship_samples"
+
 
 def TransitionEventHandler(before_after, obj, mod, event): # noqa lowercase
     if not event.transition:
@@ -74,25 +80,93 @@ def get_previous_status(instance, before=None, default=None):
 def ship_sample(sample, shipment):
     """Adds the sample to the shipment
     """
-    sample = api.get_object(sample)
-    if not IAnalysisRequest.providedBy(sample):
-        portal_type = api.get_portal_type(sample)
-        raise ValueError("Type not supported: {}".format(portal_type))
+    ship_samples([sample], shipment)
+
+
+def ship_samples(samples, shipment):
+    """Adds the samples to the shipment and transitions them to shipped
+    status. Samples that cannot be shipped are discarded. Returns the list of
+    samples that have been shipped
+    """
+    samples = map(api.get_object, samples)
+    for sample in samples:
+        if not IAnalysisRequest.providedBy(sample):
+            portal_type = api.get_portal_type(sample)
+            raise ValueError("Type not supported: {}".format(portal_type))
 
     shipment = api.get_object(shipment)
     if not IOutboundSampleShipment.providedBy(shipment):
         portal_type = api.get_portal_type(shipment)
         raise ValueError("Type not supported: {}".format(portal_type))
 
-    # Add the sample to the shipment
-    shipment.addSample(sample)
+    # Postpone the reindex of the transitioned objects until all samples are
+    # shipped, so each sample is reindexed only once
+    pool = ActionHandlerPool.get_instance()
+    pool.queue_pool()
+    try:
+        shipped = []
+        for sample in samples:
+            success, message = doActionFor(sample, "ship")
+            if not success:
+                continue
+
+            # Assign the shipment to the sample
+            sample.setOutboundShipment(shipment)
+            shipped.append(sample)
+
+        # Add the samples to the shipment
+        shipment.addSamples(shipped)
+        if shipped:
+            shipment.reindexObject(idxs=["num_samples"])
+    finally:
+        pool.resume()
+
+    return shipped
+
+
+def ship_samples_chunk(uids, shipment, chunk_size):
+    """Ships the first chunk of samples of the given size to the shipment.
+    Returns the uids of the samples that remain to be shipped
+    """
+    uids = filter(api.is_uid, uids)
+    if chunk_size <= 0:
+        chunk_size = len(uids)
+    ship_samples(uids[:chunk_size], shipment)
+    return uids[chunk_size:]
+
+
+def do_queue_or_ship_samples(samples, shipment, chunk_size=None):
+    """Adds and returns a queue task for the shipment of the samples if the
+    queue is available and the number of samples is above the chunk size.
+    Otherwise, ships the samples as usual and returns the list of samples
+    that were shipped
+    """
+    samples = filter(None, samples)
+    if not samples:
+        return []
+
+    if callable(is_queue_ready) and is_queue_ready():
+        # queue is installed and ready
+        chunk_size = api.to_int(chunk_size, default=get_chunk_size_for("ship"))
+        if 0 < chunk_size < len(samples):
+            return add_ship_samples_task(samples, shipment, chunk_size)
+
+    # ship the samples
+    return ship_samples(samples, shipment)
 
-    # Assign the shipment to the sample
-    sample.setOutboundShipment(shipment)
-    doActionFor(sample, "ship")
 
-    # Reindex the sample
-    sample.reindexObject()
+def add_ship_samples_task(samples, shipment, chunk_size):
+    """Adds and returns a queue task for the shipment of the samples, that
+    will be processed in chunks of the given size
+    """
+    uids = map(api.get_uid, samples)
+    shipment = api.get_object(shipment)
+    task = add_task(SHIP_SAMPLES_TASK, shipment, uids=uids,
+                    chunk_size=chunk_size, delay=10)
+
+    # Flush the queued uids known by current request
+    reset_queued_uids()
+    return task
 
 
 def recover_sample(sample, shipment=None):
@@ -111,15 +185,15 @@ def recover_sample(sample, shipment=None):
         shipment = api.get_object(shipment, default=None)
 
     if IOutboundSampleShipment.providedBy(shipment):
-        # Remove the sample from the shipment
-        shipment.removeSample(sample)
+        # Remove the sample from the shipment. The shipment is only reindexed
+        # if the sample was not removed beforehand, along with others
+        if api.get_uid(sample) in shipment.getRawSamples():
+            shipment.removeSample(sample)
+            shipment.reindexObject(idxs=["num_samples"])
 
     # Restore the status of sample and referred analyses
     restore_referred_sample(sample)
 
-    # Reindex the shipment
-    shipment.reindexObject()
-
 
 def restore_referred_sample(sample):
     """Rolls the status of the referred sample back to the status they had
@@ -170,7 +244,11 @@ def do_queue_or_action_for(objects, action, **kwargs):
         if chunk_size > 0:
             kwargs["chunk_size"] = chunk_size
             context = api.get_object(context)
-            return add_action_task(objects, action, context=context, **kwargs)
+            task = add_action_task(objects, action, context=context, **kwargs)
+
+            # Flush the queued uids known by current request
+            reset_queued_uids()
+            return task
 
     # perform the workflow action
     for obj in objects:
@@ -186,31 +264,42 @@ def change_workflow_state(content, wf_id, state_id, **kwargs):
         logger.error("%s: Cannot find workflow id %s" % (content, wf_id))
         return False
 
+    # Get old and new state info
+    old_state = workflow._getWorkflowStateOf(content)
+    new_state, wf_state = set_workflow_state(content, workflow, state_id,
+                                             **kwargs)
+
+    # Notify the object has been transitioned
     action = kwargs.get("action", None)
+    transition = workflow.transitions.get(action)
+    if transition:
+        notify(AfterTransitionEvent(content, workflow, old_state, new_state,
+                                    transition, wf_state, None))
+
+    # Map changes to catalog
+    content.reindexObject()
+
+
+def set_workflow_state(content, workflow, state_id, **kwargs):
+    """Sets the workflow status and updates the permissions of the object,
+    without notifying any event and without reindexing the object. Returns a
+    tuple with the new state and the status set
+    """
     wf_state = {
-        "action": action,
+        "action": kwargs.get("action", None),
         "actor": kwargs.get("actor", api.get_current_user().id),
         "comments": "Setting state to %s" % state_id,
         "review_state": state_id,
         "time": DateTime()
     }
 
-    # Get old and new state info
-    old_state = workflow._getWorkflowStateOf(content)
     new_state = workflow.states.get(state_id, None)
     if new_state is None:
         raise WorkflowException("Destination state undefined: {}"
                                 .format(state_id))
 
     # Change status and update permissions
-    portal_workflow.setStatusOf(wf_id, content, wf_state)
+    portal_workflow = api.get_tool("portal_workflow")
+    portal_workflow.setStatusOf(workflow.getId(), content, wf_state)
     workflow.updateRoleMappingsFor(content)
-
-    # Notify the object has been transitioned
-    transition = workflow.transitions.get(action)
-    if transition:
-        notify(AfterTransitionEvent(content, workflow, old_state, new_state,
-                                    transition, wf_state, None))
-
-    # Map changes to catalog
-    content.reindexObject()
+    return new_state, wf_state
@@ -18,6 +18,7 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+from senaite.referral.reception import track_inbound_sample
 from senaite.referral.workflow import TransitionEventHandler
 from senaite.referral.workflow.inboundsample import events
 
@@ -25,4 +26,6 @@ from senaite.referral.workflow.inboundsample import events
 def AfterTransitionEventHandler(inbound_sample, event): # noqa lowercase
     """Actions to be done just after a transition for an Inbound Sample
     """
+    # Update the reception counters of the shipment
+    track_inbound_sample(inbound_sample)
     TransitionEventHandler("after", inbound_sample, events, event)
@@ -18,6 +18,10 @@
 # Copyright 2021-2022 by it's authors.
 # Some rights reserved, see README and LICENSE.
 
+from senaite.referral.reception import get_reception_count
+from senaite.referral.reception import PENDING
+from senaite.referral.reception import REJECTED
+from senaite.referral.reception import TOTAL
 from senaite.referral.utils import get_sample_types_mapping
 from senaite.referral.utils import get_services_mapping
 
@@ -42,9 +46,10 @@ def after_receive_inbound_sample(inbound_sample):
     # Auto-receive the sample object
     doActionFor(sample, "receive")
 
-    # Try with the whole shipment
+    # Try with the whole shipment, if there are no more samples to receive
     shipment = inbound_sample.getInboundShipment()
-    doActionFor(shipment, "receive_inbound_shipment")
+    if get_reception_count(shipment, PENDING) == 0:
+        doActionFor(shipment, "receive_inbound_shipment")
 
 
 def after_reject_inbound_sample(inbound_sample):
@@ -54,9 +59,9 @@ def after_reject_inbound_sample(inbound_sample):
     created yet, the inbound shipment is automatically rejected as well
     """
     shipment = inbound_sample.getInboundShipment()
-    for sample in shipment.getInboundSamples():
-        if api.get_review_status(sample) != "rejected":
-            return
+    total = get_reception_count(shipment, TOTAL)
+    if get_reception_count(shipment, REJECTED) != total:
+        return
 
     # All inbound samples have been rejected. Reject the shipment
     doActionFor(shipment, "reject_inbound_shipment")